@@ -0,0 +1,40 @@
+import math
+import arcade
+from typing import Dict, Iterable, List, Tuple
+
+
+class ActivationGrid:
+    # things that only need updating while someone can see them, bucketed into big cells.
+    # only the cells around the camera get updated, everything else sleeps and catches up on the
+    # time it missed when it wakes
+    def __init__(self, cell_size: float, now: float = 0) -> None:
+        self.cell_size = cell_size
+        self.now = now
+        self.cells: Dict[Tuple[int, int], List[arcade.Sprite]] = {}
+        self.last_update: Dict[arcade.Sprite, float] = {}
+        self.awake = 0
+
+    def cell(self, x: float, y: float) -> Tuple[int, int]:
+        return (math.floor(x / self.cell_size), math.floor(y / self.cell_size))
+
+    def add(self, sprite: arcade.Sprite) -> None:
+        self.cells.setdefault(self.cell(*sprite.position), []).append(sprite)
+        self.last_update[sprite] = self.now
+
+    def extend(self, sprites: Iterable[arcade.Sprite]) -> None:
+        for sprite in sprites:
+            self.add(sprite)
+
+    def update(self, position: Tuple[float, float], radius: float, now: float) -> None:
+        self.now = now
+        self.awake = 0
+        x, y = position
+        left, bottom = self.cell(x - radius, y - radius)
+        right, top = self.cell(x + radius, y + radius)
+        for cx in range(left, right + 1):
+            for cy in range(bottom, top + 1):
+                for sprite in self.cells.get((cx, cy), ()):
+                    elapsed = now - self.last_update[sprite]
+                    self.last_update[sprite] = now
+                    sprite.update(elapsed)
+                    self.awake += 1
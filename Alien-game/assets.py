@@ -0,0 +1,42 @@
+import arcade
+from typing import Any, Callable, Dict
+from constants import TILESET
+from textures import TEXTURES
+
+
+class AssetRegistry:
+    def __init__(self) -> None:
+        self.factories: Dict[str, Callable[[], Any]] = {}
+        self.loaded: Dict[str, Any] = {}
+
+    def register(self, name: str, factory: Callable[[], Any]) -> None:
+        self.factories[name] = factory
+        self.loaded.pop(name, None)
+
+    def get(self, name: str) -> Any:
+        asset = self.loaded.get(name)
+        if asset is None:
+            asset = self.factories[name]() # nothing is loaded until someone actually needs it
+            self.loaded[name] = asset
+        return asset
+
+
+def load_font(path: str, name: str) -> str:
+    arcade.load_font(path)
+    return name # what Text wants as font_name
+
+
+def read_text(path: str) -> str:
+    with open(path, "r", encoding="utf-8") as file:
+        return file.read()
+
+
+ASSETS = AssetRegistry()
+ASSETS.register("tp_particle", lambda: TEXTURES.get_texture(TILESET, arcade.rect.LBWH(576, 448, 64, 64)))
+ASSETS.register("checkpoint_particle", lambda: arcade.texture.make_soft_circle_texture(8, arcade.color.ELECTRIC_CYAN))
+ASSETS.register("jump_particle", lambda: arcade.texture.make_circle_texture(9, arcade.color.GAINSBORO))
+ASSETS.register("starfield_shader", lambda: read_text("assets/shaders/starfield.glsl"))
+ASSETS.register("starfield_bake_shader", lambda: read_text("assets/shaders/starfield_bake.glsl"))
+ASSETS.register("particles_vs", lambda: read_text("assets/shaders/particles_vs.glsl"))
+ASSETS.register("particles_fs", lambda: read_text("assets/shaders/particles_fs.glsl"))
+ASSETS.register("seven_segment_font", lambda: load_font("assets/Seven Segment.ttf", "Seven Segment"))
@@ -0,0 +1,13 @@
+#version 330
+
+uniform sampler2D particle_texture;
+
+in vec2 uv;
+in float alpha;
+
+out vec4 f_color;
+
+void main() {
+    vec4 color = texture(particle_texture, uv);
+    f_color = vec4(color.rgb, color.a * alpha);
+}
@@ -0,0 +1,29 @@
+#version 330
+
+uniform WindowBlock {
+    mat4 projection;
+    mat4 view;
+} window;
+
+uniform vec2 texture_size;
+
+in vec2 in_vert;
+in vec2 in_uv;
+
+// one of these per particle
+in vec2 in_position;
+in float in_scale;
+in float in_angle;
+in float in_alpha;
+
+out vec2 uv;
+out float alpha;
+
+void main() {
+    float angle = radians(-in_angle); // sprite angles go clockwise
+    vec2 corner = in_vert * texture_size * in_scale;
+    corner = vec2(corner.x * cos(angle) - corner.y * sin(angle), corner.x * sin(angle) + corner.y * cos(angle));
+    gl_Position = window.projection * window.view * vec4(in_position + corner, 0.0, 1.0);
+    uv = in_uv;
+    alpha = in_alpha;
+}
@@ -0,0 +1,17 @@
+// Every frame part of the stars, the expensive noise is baked into iChannel0 by starfield_bake.glsl
+void mainImage( out vec4 fragColor, in vec2 fragCoord )
+{
+    vec4 baked = texelFetch(iChannel0, ivec2(fragCoord), 0);
+
+    // the flicker used to move through the noise by iTime / 3, now it fades from one baked slice to the next
+    float t = iTime / 3.0;
+    float slice = mod(floor(t), 3.0);
+    float f = fract(t);
+    f = f*f*(3.0-2.0*f);
+    float from = slice == 0.0 ? baked.g : (slice == 1.0 ? baked.b : baked.a);
+    float to = slice == 0.0 ? baked.b : (slice == 1.0 ? baked.a : baked.g);
+    float stars = baked.r * mix(0.4, 1.4, mix(from, to, f)); // time based flickering
+
+    // Output to screen
+    fragColor = vec4(vec3(stars),1.0);
+}
@@ -34,8 +34,12 @@ void mainImage( out vec4 fragColor, in vec2 fragCoord )
 	float stars_threshold = 8.0f; // modifies the number of stars that are visible
 	float stars_exposure = 200.0f; // modifies the overall strength of the stars
 	float stars = pow(clamp(noise(stars_direction * 200.0f), 0.0f, 1.0f), stars_threshold) * stars_exposure;
-	stars *= mix(0.4, 1.4, noise(stars_direction * 100.0f + vec3(iTime / 3.0))); // time based flickering
 
-    // Output to screen
-    fragColor = vec4(vec3(stars),1.0);
+    // Baked once per resolution: the stars themselves, then the flickering noise at three points in time,
+    // starfield.glsl blends between those instead of evaluating the noise every frame
+    vec3 flicker_direction = stars_direction * 100.0f;
+    fragColor = vec4(stars,
+                     noise(flicker_direction),
+                     noise(flicker_direction + vec3(1.0)),
+                     noise(flicker_direction + vec3(2.0)));
 }
\ No newline at end of file
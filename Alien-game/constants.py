@@ -1,5 +1,4 @@
 import enum
-import arcade.texture
 
 
 class Direction(enum.Enum):
@@ -31,24 +30,37 @@ CHECKPOINT_LIGHT_OFF = (0, 83, 138)
 CHECKPOINT_LIGHT_ON = (0, 100, 166)
 DISPLAY_LIGHT = (120, 120, 120)
 TELEPORTER_LIGHT = (80, 255, 0, 128)
+GHOST_LIGHT = (60, 60, 90)
 
 PLAYER_TEXTURE = "./assets/alien_placeholder.png"
 PLAYER_SCALE = 0.33
 COYOTE_TIME = 0.12
 ANIMATION_FPS = 10
 TIME_TILL_TP = 0.5
+PREFETCH_DISTANCE = 1500 # how close to a level_end the next level starts loading
+GHOST_ALPHA = 90
+GHOST_SAMPLE_TICKS = 4 # ghosts keep one position every this many physics ticks
 
-TP_PARTICLE = arcade.load_spritesheet("assets/levels/tileset.png").get_texture(
-    arcade.rect.LBWH(576, 448, 64, 64),
-    y_up=True,
-)
-CHECKPOINT_PARTICLE = arcade.texture.make_soft_circle_texture(8, arcade.color.ELECTRIC_CYAN)
-JUMP_PARTICLE = arcade.texture.make_circle_texture(9, arcade.color.GAINSBORO)
+TILESET = "assets/levels/tileset.png"
+
+ACTIVATION_CELL = 512 # world units per activation cell
+ACTIVATION_MARGIN = 600 # how far past the edge of the screen things stay awake
+LIGHT_CULL_MARGIN = 100 # lights this far off screen still get drawn, so nothing pops in at the edge
+PARTICLE_BUDGET = 1500 # live particles across every emitter
+PARTICLE_SOFT_BUDGET = 0.75 # past this much of the budget scenery emitters start thinning out
+PARTICLE_MARGIN = 400 # emitters this far off screen still run, slower the further out they are
+PARTICLE_MIN_RATE = 0.25
+TILE_CHUNK_SIZE = 1024 # world units per side of a static tile chunk, 16 tiles
+TILE_CHUNK_MARGIN = 64 # chunks this far off screen still get drawn
+PLATFORM_WAKE_RADIUS = 2000 # fixed instead of screen based, platforms are part of the simulation and replays
 
 ##############################
 # Physics engine stuff below #
 ##############################
 
+PHYSICS_TICK_RATE = 120 # default, can be lowered with the physics_rate setting
+MAX_PHYSICS_SUBSTEPS = 8 # per frame, past that the game slows down instead
+
 GRAVITY_VECTOR = (0, -3000)
 DEFAULT_DAMPING = 1.0
 
@@ -58,7 +70,8 @@ PLAYER_DAMPING = 0.4
 PLAYER_MAX_HOR_SPEED = 350
 PLAYER_MAX_VERT_SPEED = 5000
 
-PLAYER_SPEED = 4000
+PLAYER_SPEED = 2000 # force applied every physics tick
 PLAYER_JUMP_IMPULSE = 2000
 
-WALL_FRICTION = 0.7
\ No newline at end of file
+WALL_FRICTION = 0.7
+PLATFORM_SPEED_SCALE = 120 # change_x/change_y in the maps are pixels per 1/120 s
\ No newline at end of file
@@ -3,36 +3,39 @@ import os
 import math
 
 from player_logic import Player
-from arcade.future.light import Light, LightLayer
+from level_cache import PREFETCHER, load_level, make_tile_layer, make_object_sprite
+from arcade.future.light import Light
 from arcade.gui import (UIManager, UITextureButton, UILabel, UISliderStyle,
                         UISlider, UISpace, UITextureToggle)
 from arcade.gui.widgets.layout import UIAnchorLayout, UIBoxLayout
 from util import *
+from settings import SETTINGS
 from constants import *
+from lighting import BakedLightLayer
+from render_scale import RENDER_SCALE
+from starfield import Starfield
 
 
 class MenuBackground(arcade.View):
     def __init__(self):
         super().__init__()
-        self.window.set_fullscreen(read_settings().get("fullscreen", False))
+        self.window.set_fullscreen(SETTINGS.get("fullscreen", False))
         self.light_layer = None
         self.time = 0
-        with open("assets/shaders/stars_shader.glsl", "r", encoding="utf-8") as file:
-            self.stars_shader = arcade.experimental.Shadertoy((int(self.width), int(self.height)), file.read())
+        self.stars_shader = Starfield((int(self.width), int(self.height)))
         self.setup()
 
     def setup(self):
         self.world_camera = arcade.Camera2D()
-        self.light_layer = LightLayer(int(self.width), int(self.height))
+        self.light_layer = BakedLightLayer(int(self.width), int(self.height)) # no lightmap, just the render scale
 
-        tile_map = arcade.load_tilemap("assets/levels/main_menu.tmx")
-        self.wall_list = tile_map.sprite_lists["walls"]
+        level_data = load_level("main_menu")
+        self.wall_list = make_tile_layer(level_data, "walls")
         self.player = Player(self)
-        special = tile_map.sprite_lists["special"]
-        for sprite in special:
-            if sprite.properties.get("type", None) == "player_spawn":
-                self.player.bottom = sprite.bottom
-                self.player.center_x = sprite.center_x
+        if level_data.spawn is not None:
+            spawn = make_object_sprite(level_data, level_data.spawn.tile)
+            self.player.bottom = spawn.bottom
+            self.player.center_x = spawn.center_x
 
         radius = 500
         mode = 'soft'
@@ -52,6 +55,7 @@ class MenuBackground(arcade.View):
 
     def on_draw(self):
         self.clear()
+        RENDER_SCALE.frame()
         with self.light_layer:
             self.stars_shader.render(time=self.time)
             self.world_camera.use()
@@ -102,6 +106,8 @@ class MainMenu(MenuBackground):
             contents = os.listdir("assets/saved/")
         res = {}
         for file in contents:
+            if not file.endswith(".txt"): # replays live here too
+                continue
             try:
                 with open(f"assets/saved/{file}", "r") as file:
                     ok = [i.rstrip("\n").split(";") for i in file.readlines()]
@@ -239,6 +245,7 @@ class LevelSelection(MenuBackground):
             levels.remove("tutorial")
             levels.insert(0, "tutorial")
         for i, level in enumerate(levels):
+            PREFETCHER.request(level)
             button = UITextureButton(texture=texture_normal,
                                          texture_hovered=texture_hovered,
                                          texture_pressed=texture_pressed,
@@ -385,6 +392,7 @@ class OptionView(arcade.View):
         self.rect = arcade.rect.XYWH(self.width / 2, self.height / 2,
                                 self.width, self.height)
         self.setup()
+        SETTINGS.add_listener(self.on_settings_change)
 
     def setup(self):
         self.manager = UIManager()
@@ -397,6 +405,20 @@ class OptionView(arcade.View):
         self.anchor_layout.add(self.box_layout, anchor_x="center")
         self.manager.add(self.anchor_layout)
 
+    def on_settings_change(self, key, value):
+        if key == "volume":
+            self.volume_label.text = f"Volume: {value}%"
+        elif key == "fullscreen":
+            self.fullscreen_toggle.value = value
+        elif key in ("render_scale", "auto_render_scale"):
+            self.render_scale_label.text = self.render_scale_text()
+            self.auto_scale_toggle.value = SETTINGS.get("auto_render_scale", True)
+
+    def render_scale_text(self) -> str:
+        if SETTINGS.get("auto_render_scale", True):
+            return f"Resolution: auto {RENDER_SCALE.scale:.0%}"
+        return f"Resolution: {SETTINGS.get('render_scale', 100)}%"
+
     def setup_widgets(self):
         label = UILabel(text="Options",
                         font_size=20,
@@ -408,16 +430,16 @@ class OptionView(arcade.View):
         texture_hovered = arcade.load_texture("assets/ui/button_hover.png")
         texture_pressed = arcade.load_texture("assets/ui/button_pressed.png")
         volume_layout = UIBoxLayout(vertical=False, space_between=10)
-        volume_label = UILabel(text=f"Volume: {read_settings().get("volume", 100)}%",
+        self.volume_label = UILabel(text=f"Volume: {SETTINGS.get("volume", 100)}%",
                                font_size=20,
                                text_color=arcade.color.WHITE,
                                width=300,
                                align="center"
                                )
-        volume_layout.add(volume_label)
+        volume_layout.add(self.volume_label)
         ok = UISliderStyle()
         volume_slider = UISlider(minimum=0, maximum=100, step=1, # style={"normal":ok}
-                                 value=read_settings().get("volume", 100))
+                                 value=SETTINGS.get("volume", 100))
 
         volume_layout.add(volume_slider)
         self.box_layout.add(volume_layout)
@@ -437,11 +459,30 @@ class OptionView(arcade.View):
         self.fullscreen_toggle = UITextureToggle(on_texture=toggle_on,
                                             off_texture=toggle_off,
                                             width=32, height=32,)
-        self.fullscreen_toggle.value = read_settings().get("fullscreen", self.window.fullscreen)
+        self.fullscreen_toggle.value = SETTINGS.get("fullscreen", self.window.fullscreen)
 
         fullscreen_layout.add(self.fullscreen_toggle)
         self.box_layout.add(fullscreen_layout)
 
+        # how sharp the stars and lights are, auto lowers it when frames start taking too long
+        render_scale_layout = UIBoxLayout(vertical=False, space_between=10)
+        self.render_scale_label = UILabel(text=self.render_scale_text(),
+                                          font_size=20,
+                                          text_color=arcade.color.WHITE,
+                                          width=300,
+                                          align="center"
+                                          )
+        render_scale_layout.add(self.render_scale_label)
+        render_scale_slider = UISlider(minimum=50, maximum=100, step=5,
+                                       value=SETTINGS.get("render_scale", 100))
+        render_scale_layout.add(render_scale_slider)
+        self.auto_scale_toggle = UITextureToggle(on_texture=toggle_on,
+                                                 off_texture=toggle_off,
+                                                 width=32, height=32,)
+        self.auto_scale_toggle.value = SETTINGS.get("auto_render_scale", True)
+        render_scale_layout.add(self.auto_scale_toggle)
+        self.box_layout.add(render_scale_layout)
+
         spacer = UISpace(height=30, )
         self.box_layout.add(spacer)
 
@@ -455,9 +496,16 @@ class OptionView(arcade.View):
 
         @volume_slider.event("on_change")
         def volume_slider_value(event):
-            volume_label.text = f"Volume: {int(event.new_value)}%"
             save_settings(volume=int(event.new_value))
 
+        @render_scale_slider.event("on_change")
+        def render_scale_slider_value(event):
+            save_settings(render_scale=int(event.new_value), auto_render_scale=False) # picking one turns auto off
+
+        @self.auto_scale_toggle.event("on_change")
+        def on_auto_scale_toggle(event):
+            save_settings(auto_render_scale=self.auto_scale_toggle.value)
+
         @texture_button.event("on_click")
         def on_click_texture_button(event):
             self.manager.disable()
@@ -478,6 +526,9 @@ class OptionView(arcade.View):
     def on_show(self):
         pass
 
+    def on_hide_view(self):
+        SETTINGS.remove_listener(self.on_settings_change)
+
     def on_draw(self):
         self.clear()
         arcade.draw_rect_filled(self.rect, arcade.color.BLACK)
@@ -487,7 +538,6 @@ class OptionView(arcade.View):
         if symbol == arcade.key.F11:
             fullscreen = not self.window.fullscreen
             save_settings(fullscreen=fullscreen)
-            self.fullscreen_toggle.value = read_settings().get("fullscreen", self.window.fullscreen)
             self.window.set_fullscreen(not self.window.fullscreen)
         elif symbol == arcade.key.ESCAPE:
             self.manager.disable()
@@ -0,0 +1,145 @@
+import os
+import struct
+import arcade
+from typing import BinaryIO, Tuple
+from arcade.future.light import Light
+
+from constants import *
+from player_logic import PLAYER_ANIMATIONS, get_animation_set
+from replay import write_varint, zigzag, unzigzag
+
+MAGIC = b"AGST"
+VERSION = 1
+GHOST_STATES = tuple(PLAYER_ANIMATIONS.keys())
+
+Sample = Tuple[int, int, int] # x, y, packed animation state
+
+
+def ghost_path(level: str, race_id: int) -> str:
+    return f"assets/saved/{level}_{race_id}.ghost"
+
+
+def pack_state(player: arcade.Sprite) -> int:
+    # frame in the low 3 bits, then facing left, then the animation, one byte for everything the player has
+    return player.animation_frame | (player.direction == Direction.LEFT) << 3 | GHOST_STATES.index(player.animation_state) << 4
+
+
+class GhostRecorder:
+    # a position and animation every few ticks of the race, whole pixels as varint deltas
+    def __init__(self, sample_ticks: int, tick: float) -> None:
+        self.sample_ticks = sample_ticks
+        self.out = bytearray(MAGIC)
+        write_varint(self.out, VERSION)
+        self.out += struct.pack("<d", sample_ticks * tick) # seconds between samples
+        self.ticks = 0
+        self.last = (0, 0)
+
+    def start(self, player: arcade.Sprite) -> None:
+        self.write(player)
+
+    def record(self, player: arcade.Sprite) -> None: # once per tick
+        self.ticks += 1
+        if self.ticks % self.sample_ticks == 0:
+            self.write(player)
+
+    def write(self, player: arcade.Sprite) -> None:
+        x, y = round(player.center_x), round(player.center_y)
+        write_varint(self.out, zigzag(x - self.last[0]))
+        write_varint(self.out, zigzag(y - self.last[1]))
+        write_varint(self.out, pack_state(player))
+        self.last = (x, y)
+
+    def to_bytes(self) -> bytes:
+        return bytes(self.out)
+
+
+def read_stream_varint(file: BinaryIO) -> int | None:
+    value = 0
+    shift = 0
+    while True:
+        byte = file.read(1)
+        if not byte:
+            return None
+        value |= (byte[0] & 0x7F) << shift
+        if byte[0] < 0x80:
+            return value
+        shift += 7
+
+
+class GhostRunner(arcade.Sprite):
+    # plays a saved best run back next to the player. samples are read from the file as the race goes,
+    # only the two around the current time are ever in memory
+    def __init__(self, path: str) -> None:
+        super().__init__()
+        self.file: BinaryIO | None = open(path, "rb")
+        try:
+            if self.file.read(4) != MAGIC or read_stream_varint(self.file) != VERSION:
+                raise ValueError(f"{path} is not a ghost")
+            self.interval = struct.unpack("<d", self.file.read(8))[0]
+        except (ValueError, struct.error):
+            self.close() # cut short or not a ghost at all, load_ghost treats it as missing
+            raise
+        self.animations = get_animation_set("player", PLAYER_ANIMATIONS)
+        self.scale = PLAYER_SCALE
+        self.alpha = GHOST_ALPHA
+        self.light = Light(0, 0, 150, GHOST_LIGHT, 'soft')
+        self.position_xy = (0, 0)
+        self.previous: Sample | None = None
+        self.next: Sample | None = self.read_sample()
+        self.index = -1 # which sample self.next is
+        self.update_time(0)
+
+    def read_sample(self) -> Sample | None:
+        if self.file is None:
+            return None
+        dx = read_stream_varint(self.file)
+        dy = read_stream_varint(self.file)
+        state = read_stream_varint(self.file)
+        if state is None:
+            self.close()
+            return None
+        x = self.position_xy[0] + unzigzag(dx)
+        y = self.position_xy[1] + unzigzag(dy)
+        self.position_xy = (x, y)
+        return (x, y, state)
+
+    def update_time(self, race_time: float) -> None:
+        target = race_time / self.interval
+        while self.next is not None and self.index + 1 <= target:
+            self.previous = self.next
+            self.next = self.read_sample()
+            self.index += 1
+        if self.previous is None:
+            return
+        if self.next is None: # the best run is over, the ghost waits at the finish
+            x, y = self.previous[:2]
+        else:
+            alpha = min(max(target - self.index, 0), 1)
+            x = arcade.math.lerp(self.previous[0], self.next[0], alpha)
+            y = arcade.math.lerp(self.previous[1], self.next[1], alpha)
+        self.position = (x, y)
+        self.light.position = (x, y)
+        state = self.previous[2]
+        direction = Direction.LEFT if state & 8 else Direction.RIGHT
+        frames = self.animations[direction][GHOST_STATES[state >> 4]]
+        self.texture = frames[(state & 7) % len(frames)]
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def save_ghost(level: str, race_id: int, data: bytes) -> None:
+    with open(ghost_path(level, race_id), "wb") as file:
+        file.write(data)
+
+
+def load_ghost(level: str, race_id: int) -> GhostRunner | None:
+    path = ghost_path(level, race_id)
+    if not os.path.exists(path):
+        return None
+    try:
+        return GhostRunner(path)
+    except (ValueError, struct.error):
+        return None
@@ -0,0 +1,116 @@
+import arcade
+from typing import Dict, List, Tuple
+
+GLYPHS = "0123456789:"
+GLYPH_SETS: Dict[Tuple[str, int], Dict[str, arcade.Texture]] = {} # (font, size) -> glyph textures, made once per run
+
+
+def glyph_textures(font_name: str, font_size: int) -> Dict[str, arcade.Texture]:
+    # every glyph the timer needs, rendered white into the default atlas once, sprites tint them
+    glyphs = GLYPH_SETS.get((font_name, font_size))
+    if glyphs is not None:
+        return glyphs
+    atlas = arcade.get_window().ctx.default_atlas
+    glyphs = {}
+    for glyph in GLYPHS:
+        text = arcade.Text(glyph, 0, 0, arcade.color.WHITE, font_size, font_name=font_name, anchor_y="baseline")
+        size = (int(text.right - text.left), int(text.top - text.bottom))
+        text.y = -text.bottom
+        texture = arcade.Texture.create_empty(f"hud-{font_name}-{font_size}-{glyph}", size)
+        atlas.add(texture)
+        with atlas.render_into(texture) as fbo:
+            fbo.clear(color=arcade.color.TRANSPARENT_BLACK)
+            text.draw()
+        glyphs[glyph] = texture
+    GLYPH_SETS[(font_name, font_size)] = glyphs
+    return glyphs
+
+
+class SegmentTimer:
+    # m:ss:cc out of one sprite per character. a digit only gets a new texture when its value changes,
+    # nothing is laid out again unless the minutes grow another digit
+    def __init__(self, sprite_list: arcade.SpriteList, center: Tuple[float, float], font_name: str, font_size: int,
+                 color: Tuple[int, int, int, int]) -> None:
+        self.sprite_list = sprite_list
+        self.glyphs = glyph_textures(font_name, font_size)
+        self.cell = max(self.glyphs[digit].width for digit in "0123456789") # fixed width, the numbers don't wobble
+        self.center = center
+        self.offset = (0.0, 0.0)
+        self.color = color
+        self._visible = True
+        self.sprites: List[arcade.Sprite] = []
+        self.widths: List[float] = [] # of each sprite's slot
+        self.digits: List[arcade.Sprite] = [] # the digit sprites, most significant first
+        self.values: List[int] = [] # what each of them shows right now
+        self.minute_digits = 0
+        self.set_time(0)
+
+    def layout(self, minute_digits: int) -> None:
+        for sprite in self.sprites:
+            sprite.remove_from_sprite_lists()
+        self.minute_digits = minute_digits
+        pattern = "0" * minute_digits + ":00:00"
+        self.sprites = []
+        self.widths = []
+        self.digits = []
+        for glyph in pattern:
+            sprite = arcade.Sprite(self.glyphs[glyph])
+            sprite.color = self.color
+            sprite.visible = self._visible
+            self.sprites.append(sprite)
+            self.sprite_list.append(sprite)
+            self.widths.append(sprite.width if glyph == ":" else self.cell)
+            if glyph != ":":
+                self.digits.append(sprite)
+        self.values = [0] * len(self.digits)
+        self.place()
+
+    def place(self) -> None:
+        left = self.center[0] + self.offset[0] - sum(self.widths) / 2
+        y = self.center[1] + self.offset[1]
+        for sprite, width in zip(self.sprites, self.widths):
+            sprite.center_x = left + width / 2
+            sprite.center_y = y
+            left += width
+
+    def move(self, center: Tuple[float, float], offset: Tuple[float, float] = (0, 0)) -> None:
+        if center == self.center and offset == self.offset:
+            return
+        self.center = center
+        self.offset = offset
+        self.place()
+
+    def set_time(self, time: float) -> None:
+        centis = int(time * 100)
+        minutes, centis = divmod(centis, 6000)
+        minute_digits = len(str(minutes)) if minutes >= 10 else 1 # only reached past ten minutes
+        if minute_digits != self.minute_digits:
+            self.layout(minute_digits)
+        # lowest digit first, only the ones that changed get a new texture
+        values = self.values
+        digits = self.digits
+        i = len(digits) - 1
+        for value in (centis % 10, centis // 10 % 10, centis // 100 % 10, centis // 1000):
+            if values[i] != value:
+                values[i] = value
+                digits[i].texture = self.glyphs[GLYPHS[value]]
+            i -= 1
+        while i >= 0:
+            value = minutes % 10
+            minutes //= 10
+            if values[i] != value:
+                values[i] = value
+                digits[i].texture = self.glyphs[GLYPHS[value]]
+            i -= 1
+
+    @property
+    def visible(self) -> bool:
+        return self._visible
+
+    @visible.setter
+    def visible(self, visible: bool) -> None:
+        if visible == self._visible:
+            return
+        self._visible = visible
+        for sprite in self.sprites:
+            sprite.visible = visible
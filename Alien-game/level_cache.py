@@ -0,0 +1,515 @@
+import os
+import array
+import pickle
+import hashlib
+import pathlib
+import threading
+import arcade
+import pytiled_parser
+from xml.etree import ElementTree
+from arcade.hitbox import RotatableHitBox
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, NamedTuple, Tuple
+from textures import TEXTURES
+
+
+LEVELS_DIR = "assets/levels"
+CACHE_DIR = "assets/levels/.cache"
+CACHE_MAGIC = b"ALVL"
+CACHE_VERSION = 2
+
+FLIPPED_HORIZONTALLY = 0x80000000
+FLIPPED_VERTICALLY = 0x40000000
+FLIPPED_DIAGONALLY = 0x20000000
+GID_MASK = 0x1FFFFFFF
+
+
+class TileInfo(NamedTuple):
+    source: str # tileset image
+    rect: Tuple[int, int, int, int] # LBWH in the image, y up
+    hit_box: Tuple[Tuple[float, float], ...] | None # from the tile's collision shape in the tileset, if it has one
+
+
+class TileLayer(NamedTuple):
+    name: str
+    cells: bytes # array("I") of row * width + column, only for non empty cells
+    gids: bytes # array("I") of raw gids, flip flags included
+    alpha: int
+    visible: bool
+
+
+class TileObject(NamedTuple):
+    gid: int
+    center_x: float
+    center_y: float
+    width: float
+    height: float
+    angle: float
+    alpha: int
+    visible: bool
+    properties: Dict[str, Any]
+
+
+class SpawnPoint(NamedTuple):
+    tile: TileObject # sprite.bottom goes by the hit box, so the spawn needs its texture to be placed exactly
+
+
+class LevelEndRecord(NamedTuple):
+    tile: TileObject
+    send_to: str
+
+
+class TeleporterRecord(NamedTuple):
+    tile: TileObject
+    id: int
+    send_to: int
+
+
+class TextDisplayRecord(NamedTuple):
+    center_x: float
+    center_y: float
+    width: float
+    height: float
+    text: str
+    color: Tuple[int, int, int, int]
+    font_size: int
+    draw_screen: bool
+
+
+class TimerDisplayRecord(NamedTuple):
+    center_x: float
+    center_y: float
+    width: float
+    height: float
+    race_id: int
+
+
+class CheckpointRecord(NamedTuple):
+    center_x: float
+    center_y: float
+
+
+class RaceEndRecord(NamedTuple):
+    center_x: float
+    center_y: float
+    race_id: int
+    type: str
+
+
+class PlatformRecord(NamedTuple):
+    tile: TileObject
+    change_x: float
+    change_y: float
+    boundary_left: float # world units past the platform's edge, the edge comes from the sprite's hit box
+    boundary_right: float
+    boundary_top: float
+    boundary_bottom: float
+
+
+class CompiledLevel(NamedTuple):
+    name: str
+    width: int
+    height: int
+    tile_width: int
+    tile_height: int
+    tiles: Dict[int, TileInfo]
+    tile_layers: Dict[str, TileLayer]
+    collisions: Tuple[TileObject, ...]
+    platforms: Tuple[PlatformRecord, ...]
+    spawn: SpawnPoint | None
+    level_ends: Tuple[LevelEndRecord, ...]
+    teleporters: Tuple[TeleporterRecord, ...]
+    text_displays: Tuple[TextDisplayRecord, ...]
+    timer_displays: Tuple[TimerDisplayRecord, ...]
+    checkpoints: Tuple[CheckpointRecord, ...]
+    race_ends: Tuple[RaceEndRecord, ...]
+
+
+class PreparedLevel(NamedTuple): # everything setup needs that can be built off the main thread
+    level: CompiledLevel
+    wall_rects: Tuple[Tuple[float, float, float, float], ...] # static collision boxes, (left, bottom, right, top)
+    # the sprites too, setup only has to put them in sprite lists. a prepared level is only good for one setup
+    tiles: Dict[str, Tuple[arcade.Sprite, ...]] # per tile layer
+    collisions: Tuple[arcade.Sprite, ...]
+    platforms: Tuple[arcade.Sprite, ...]
+    spawn: arcade.Sprite | None
+    level_ends: Tuple[arcade.Sprite, ...] # same order as level.level_ends
+    teleporters: Tuple[arcade.Sprite, ...] # same order as level.teleporters
+
+    def tile_list(self, name: str, use_spatial_hash: bool = False) -> arcade.SpriteList:
+        sprite_list = make_sprite_list(self.tiles.get(name, ()), use_spatial_hash)
+        layer = self.level.tile_layers.get(name)
+        sprite_list.visible = layer is None or layer.visible
+        return sprite_list
+
+    def visible_tiles(self, name: str) -> Tuple[arcade.Sprite, ...]:
+        layer = self.level.tile_layers.get(name)
+        return self.tiles.get(name, ()) if layer is None or layer.visible else ()
+
+
+class CacheHeader(NamedTuple):
+    version: int
+    sources: Tuple[Tuple[str, int, str], ...] # (path, mtime_ns, sha1)
+
+
+LOADED: Dict[str, Tuple[CacheHeader, CompiledLevel]] = {}
+LOAD_LOCK = threading.RLock() # the prefetch thread and the main thread can ask for the same level
+GID_TEXTURES: Dict[Tuple[str, int], arcade.Texture] = {}
+
+
+def level_path(name: str) -> str:
+    return f"{LEVELS_DIR}/{name}.tmx"
+
+
+def cache_path(name: str) -> str:
+    return f"{CACHE_DIR}/{name}.lvl"
+
+
+def file_hash(path: str) -> str:
+    with open(path, "rb") as file:
+        return hashlib.sha1(file.read()).hexdigest()
+
+
+def alpha_from_opacity(opacity: float) -> int:
+    return int(opacity * 255) if opacity else 255
+
+
+def compile_tile_object(obj: pytiled_parser.tiled_object.Tile, map_height: float, alpha: int) -> TileObject:
+    width, height = obj.size.width, obj.size.height
+    angle = obj.rotation or 0
+    x = obj.coordinates.x
+    y = map_height - obj.coordinates.y # tiled anchors tile objects at their bottom left
+    rotated_x, rotated_y = arcade.math.rotate_point(width / 2, height / 2, 0, 0, angle)
+    return TileObject(obj.gid, x + rotated_x, y + rotated_y, width, height, angle,
+                      alpha, obj.visible, dict(obj.properties or {}))
+
+
+def compile_tile_hit_box(tile: pytiled_parser.Tile) -> Tuple[Tuple[float, float], ...] | None:
+    # same conversion as arcade's tilemap, only rectangles are used by alien.tsx
+    if tile.objects is None or not isinstance(tile.objects, pytiled_parser.ObjectLayer):
+        return None
+    for hitbox in tile.objects.tiled_objects:
+        if isinstance(hitbox, pytiled_parser.tiled_object.Rectangle) and hitbox.size is not None:
+            half_w, half_h = tile.tileset.tile_width / 2, tile.tileset.tile_height / 2
+            sx = hitbox.coordinates.x - half_w
+            sy = -(hitbox.coordinates.y - half_h)
+            ex = hitbox.coordinates.x + hitbox.size.width - half_w
+            ey = -(hitbox.coordinates.y + hitbox.size.height) + half_h
+            return ((sx, sy), (ex, sy), (ex, ey), (sx, ey))
+        if isinstance(hitbox, (pytiled_parser.tiled_object.Polygon, pytiled_parser.tiled_object.Polyline)):
+            half_w, half_h = tile.tileset.tile_width / 2, tile.tileset.tile_height / 2
+            points = [(point.x + hitbox.coordinates.x - half_w, -(point.y + hitbox.coordinates.y - half_h))
+                      for point in hitbox.points]
+            if points[0] == points[-1]:
+                points.pop()
+            return tuple(points)
+    return None
+
+
+def compile_tiles(tiled_map: pytiled_parser.TiledMap, gids: set) -> Dict[int, TileInfo]:
+    tiles = {}
+    firstgids = sorted(tiled_map.tilesets.keys())
+    for gid in gids:
+        firstgid = max(i for i in firstgids if i <= gid)
+        tileset = tiled_map.tilesets[firstgid]
+        tile_id = gid - firstgid
+        margin = tileset.margin or 0
+        spacing = tileset.spacing or 0
+        column, row = tile_id % tileset.columns, tile_id // tileset.columns
+        x = margin + column * (tileset.tile_width + spacing)
+        y_top = margin + row * (tileset.tile_height + spacing)
+        y = tileset.image_height - y_top - tileset.tile_height
+        tile = (tileset.tiles or {}).get(tile_id)
+        if tile is not None and tile.tileset is None:
+            tile.tileset = tileset
+        hit_box = compile_tile_hit_box(tile) if tile is not None else None
+        source = os.path.relpath(tileset.image).replace(os.sep, "/")
+        tiles[gid] = TileInfo(source, (x, y, tileset.tile_width, tileset.tile_height), hit_box)
+    return tiles
+
+
+def parse_color(value: str) -> Tuple[int, int, int, int]:
+    return tuple(int(i) for i in value.split("."))
+
+
+def compile_level(name: str) -> Tuple[CompiledLevel, List[str]]:
+    tiled_map = pytiled_parser.parse_map(pathlib.Path(level_path(name)))
+    width, height = tiled_map.map_size.width, tiled_map.map_size.height
+    tile_width, tile_height = tiled_map.tile_size.width, tiled_map.tile_size.height
+    map_height = height * tile_height
+
+    used_gids = set()
+    tile_layers = {}
+    objects: Dict[str, List[TileObject]] = {}
+    for layer in tiled_map.layers:
+        if isinstance(layer, pytiled_parser.TileLayer):
+            cells = array.array("I")
+            gids = array.array("I")
+            for row_index, row in enumerate(layer.data):
+                for column_index, gid in enumerate(row):
+                    if gid == 0:
+                        continue
+                    cells.append(row_index * width + column_index)
+                    gids.append(gid)
+                    used_gids.add(gid & GID_MASK)
+            tile_layers[layer.name] = TileLayer(layer.name, cells.tobytes(), gids.tobytes(),
+                                                alpha_from_opacity(layer.opacity), layer.visible)
+        elif isinstance(layer, pytiled_parser.ObjectLayer):
+            alpha = alpha_from_opacity(layer.opacity)
+            layer_objects = objects.setdefault(layer.name, [])
+            for obj in layer.tiled_objects:
+                if isinstance(obj, pytiled_parser.tiled_object.Tile):
+                    layer_objects.append(compile_tile_object(obj, map_height, alpha))
+                    used_gids.add(obj.gid & GID_MASK)
+
+    spawn = None
+    level_ends, teleporters, text_displays = [], [], []
+    for obj in objects.get("special", []):
+        props = obj.properties
+        type = props.get("type")
+        if type == "player_spawn":
+            spawn = SpawnPoint(obj)
+        elif type == "level_end":
+            level_ends.append(LevelEndRecord(obj, props["send_to"]))
+        elif type == "text_display":
+            text_displays.append(TextDisplayRecord(obj.center_x, obj.center_y, obj.width, obj.height,
+                                                   props["text"], parse_color(props["color"]),
+                                                   props["font_size"], props["draw_screen"]))
+        elif type == "teleporter":
+            teleporters.append(TeleporterRecord(obj, props["id"], props["send_to"]))
+
+    platforms = []
+    for obj in objects.get("platforms", []):
+        props = obj.properties
+        platforms.append(PlatformRecord(obj, float(props.get("change_x", 0)), float(props.get("change_y", 0)),
+                                        float(props.get("boundary_left", 0)) * tile_width,
+                                        float(props.get("boundary_right", 0)) * tile_width,
+                                        float(props.get("boundary_top", 0)) * tile_height,
+                                        float(props.get("boundary_bottom", 0)) * tile_height))
+
+    level = CompiledLevel(
+        name=name,
+        width=width,
+        height=height,
+        tile_width=tile_width,
+        tile_height=tile_height,
+        tiles=compile_tiles(tiled_map, used_gids),
+        tile_layers=tile_layers,
+        collisions=tuple(objects.get("collisions", [])),
+        platforms=tuple(platforms),
+        spawn=spawn,
+        level_ends=tuple(level_ends),
+        teleporters=tuple(teleporters),
+        text_displays=tuple(text_displays),
+        timer_displays=tuple(TimerDisplayRecord(i.center_x, i.center_y, i.width, i.height, i.properties["race_id"])
+                             for i in objects.get("displays", [])),
+        checkpoints=tuple(CheckpointRecord(i.center_x, i.center_y) for i in objects.get("checkpoints", [])),
+        race_ends=tuple(RaceEndRecord(i.center_x, i.center_y, i.properties["race_id"], i.properties["type"])
+                        for i in objects.get("ends", [])),
+    )
+    sources = [level_path(name)]
+    for tileset in ElementTree.parse(level_path(name)).getroot().iter("tileset"):
+        if "source" in tileset.attrib: # external .tsx
+            sources.append(f"{LEVELS_DIR}/{tileset.attrib['source']}")
+    return level, sources
+
+
+def make_header(sources: List[str]) -> CacheHeader:
+    return CacheHeader(CACHE_VERSION, tuple((path, os.stat(path).st_mtime_ns, file_hash(path)) for path in sources))
+
+
+def header_is_fresh(header: CacheHeader) -> Tuple[bool, bool]:
+    # (usable, mtimes changed), a touched but unchanged file only costs a hash
+    if header.version != CACHE_VERSION:
+        return False, False
+    touched = False
+    for path, mtime, sha1 in header.sources:
+        try:
+            if os.stat(path).st_mtime_ns == mtime:
+                continue
+        except FileNotFoundError:
+            return False, False
+        if file_hash(path) != sha1:
+            return False, False
+        touched = True
+    return True, touched
+
+
+def read_cache(name: str) -> Tuple[CacheHeader, CompiledLevel] | None:
+    try:
+        with open(cache_path(name), "rb") as file:
+            if file.read(len(CACHE_MAGIC)) != CACHE_MAGIC:
+                return None
+            header = pickle.load(file)
+            fresh, touched = header_is_fresh(header)
+            if not fresh:
+                return None
+            level = pickle.load(file)
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError, AttributeError, TypeError):
+        return None
+    if touched:
+        header = make_header([i[0] for i in header.sources])
+        try:
+            write_cache(header, level) # so the next load skips the hashing
+        except OSError: # read only install, the cache is still good, it just stays touched
+            pass
+    return header, level
+
+
+def write_cache(header: CacheHeader, level: CompiledLevel) -> None:
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = cache_path(level.name) + ".tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(CACHE_MAGIC)
+        pickle.dump(header, file, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(level, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, cache_path(level.name))
+
+
+def load_level(name: str) -> CompiledLevel:
+    with LOAD_LOCK:
+        loaded = LOADED.get(name)
+        if loaded is not None:
+            fresh, touched = header_is_fresh(loaded[0])
+            if fresh and not touched:
+                return loaded[1]
+        loaded = read_cache(name)
+        if loaded is None:
+            level, sources = compile_level(name)
+            loaded = (make_header(sources), level)
+            try:
+                write_cache(*loaded)
+            except OSError: # read only install, keep it in memory at least
+                pass
+        LOADED[name] = loaded
+        return loaded[1]
+
+
+def prepare_level(name: str) -> PreparedLevel:
+    level = load_level(name)
+    rects = [(obj.center_x - obj.width / 2, obj.center_y - obj.height / 2,
+              obj.center_x + obj.width / 2, obj.center_y + obj.height / 2) for obj in level.collisions]
+    # hand drawn, already about as few boxes as it gets
+    return PreparedLevel(
+        level, tuple(rects),
+        {name: tuple(make_tile_sprites(level, name)) for name in level.tile_layers},
+        tuple(make_object_sprite(level, obj) for obj in level.collisions),
+        tuple(make_platform_sprite(level, record) for record in level.platforms),
+        make_object_sprite(level, level.spawn.tile) if level.spawn is not None else None,
+        tuple(make_object_sprite(level, record.tile) for record in level.level_ends),
+        tuple(make_object_sprite(level, record.tile) for record in level.teleporters),
+    )
+
+
+class LevelPrefetcher:
+    def __init__(self) -> None:
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="level-prefetch")
+        self.pending: Dict[str, Future] = {}
+
+    def request(self, name: str) -> None:
+        if name not in self.pending:
+            self.pending[name] = self.executor.submit(prepare_level, name)
+
+    def is_ready(self, name: str) -> bool:
+        future = self.pending.get(name)
+        return future is not None and future.done()
+
+    def take(self, name: str) -> PreparedLevel:
+        future = self.pending.pop(name, None)
+        if future is None:
+            return prepare_level(name)
+        try:
+            prepared = future.result() # usually done already, otherwise this only waits for the rest of it
+        except Exception:
+            return prepare_level(name) # let the error (if any) happen on the main thread
+        if LOADED.get(name, (None, None))[1] is not prepared.level: # source changed since the prefetch
+            return prepare_level(name)
+        return prepared
+
+
+PREFETCHER = LevelPrefetcher()
+
+
+def texture_for_gid(level: CompiledLevel, gid: int) -> arcade.Texture:
+    tile = level.tiles[gid & GID_MASK]
+    key = (tile.source, gid)
+    texture = GID_TEXTURES.get(key)
+    if texture is None:
+        texture = TEXTURES.get_texture(tile.source, arcade.rect.LBWH(*tile.rect))
+        if gid & FLIPPED_DIAGONALLY:
+            texture = texture.flip_diagonally()
+        if gid & FLIPPED_HORIZONTALLY:
+            texture = texture.flip_horizontally()
+        if gid & FLIPPED_VERTICALLY:
+            texture = texture.flip_vertically()
+        GID_TEXTURES[key] = texture
+    return texture
+
+
+def make_tile_sprite(level: CompiledLevel, gid: int) -> arcade.Sprite:
+    sprite = arcade.Sprite(texture_for_gid(level, gid))
+    points = level.tiles[gid & GID_MASK].hit_box
+    if points is not None:
+        if gid & FLIPPED_VERTICALLY:
+            points = [(x, -y) for x, y in points]
+        if gid & FLIPPED_HORIZONTALLY:
+            points = [(-x, y) for x, y in points]
+        if gid & FLIPPED_DIAGONALLY:
+            points = [(y, x) for x, y in points]
+        sprite.hit_box = RotatableHitBox(points, position=sprite.position, angle=sprite.angle, scale=sprite.scale)
+    sprite.properties["tile_id"] = (gid & GID_MASK) - 1
+    return sprite
+
+
+def make_object_sprite(level: CompiledLevel, obj: TileObject) -> arcade.Sprite:
+    sprite = make_tile_sprite(level, obj.gid)
+    sprite.width = obj.width
+    sprite.height = obj.height
+    sprite.position = (obj.center_x, obj.center_y)
+    sprite.angle = obj.angle
+    sprite.visible = obj.visible
+    sprite.alpha = obj.alpha
+    sprite.properties.update(obj.properties)
+    return sprite
+
+
+def make_sprite_list(sprites, use_spatial_hash: bool = False) -> arcade.SpriteList:
+    sprite_list = arcade.SpriteList(use_spatial_hash=use_spatial_hash)
+    sprite_list.extend(sprites)
+    return sprite_list
+
+
+def make_platform_sprite(level: CompiledLevel, record: PlatformRecord) -> arcade.Sprite:
+    platform = make_object_sprite(level, record.tile)
+    platform.change_x = record.change_x
+    platform.change_y = record.change_y
+    # from the hit box like load_tilemap did, not the object's rectangle
+    platform.boundary_left = platform.left + record.boundary_left
+    platform.boundary_right = platform.right + record.boundary_right
+    platform.boundary_top = platform.top + record.boundary_top
+    platform.boundary_bottom = platform.bottom + record.boundary_bottom
+    return platform
+
+
+def make_tile_sprites(level: CompiledLevel, name: str) -> List[arcade.Sprite]:
+    layer = level.tile_layers.get(name)
+    if layer is None:
+        return []
+    cells = array.array("I", layer.cells)
+    gids = array.array("I", layer.gids)
+    sprites = []
+    for cell, gid in zip(cells, gids):
+        row, column = divmod(cell, level.width)
+        sprite = make_tile_sprite(level, gid)
+        sprite.center_x = column * level.tile_width + sprite.width / 2
+        sprite.center_y = (level.height - row - 1) * level.tile_height + sprite.height / 2
+        sprite.alpha = layer.alpha
+        sprites.append(sprite)
+    return sprites
+
+
+def make_tile_layer(level: CompiledLevel, name: str, use_spatial_hash: bool = False) -> arcade.SpriteList:
+    sprite_list = make_sprite_list(make_tile_sprites(level, name), use_spatial_hash)
+    layer = level.tile_layers.get(name)
+    sprite_list.visible = layer is None or layer.visible
+    return sprite_list
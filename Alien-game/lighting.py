@@ -0,0 +1,255 @@
+import io
+import os
+import math
+import pickle
+import hashlib
+import arcade
+from array import array
+from PIL import Image
+from arcade.future.light import Light, LightLayer
+from arcade.texture_atlas import DefaultTextureAtlas
+from typing import Dict, List, Set, Tuple
+
+from level_cache import CACHE_DIR
+from render_scale import RENDER_SCALE, scaled_size
+
+LIGHTMAP_MAGIC = b"ALMP"
+LIGHTMAP_VERSION = 1
+LIGHTMAP_SCALE = 0.5 # texels per world unit, soft lights are smooth enough to take the blur
+LIGHTMAP_TILE = 1024 # texels per side, big maps get split into more than one
+
+LightmapTile = Tuple[Tuple[float, float, float, float], bytes] # LBWH in the world, png
+LIGHTMAPS: Dict[str, Tuple[str, arcade.SpriteList]] = {} # level -> (key, tiles), going back to a level doesn't even decode them again
+
+
+def lightmap_path(level: str) -> str:
+    return f"{CACHE_DIR}/{level}.lightmap"
+
+
+def lightmap_key(lights: List[Light]) -> str:
+    # the lights decide what the map looks like, a change to any of them bakes it again
+    sha1 = hashlib.sha1(f"{LIGHTMAP_SCALE} {LIGHTMAP_TILE}".encode())
+    for light in lights:
+        sha1.update(repr((light.position, light.radius, light._attenuation, tuple(light._color))).encode())
+    return sha1.hexdigest()
+
+
+def read_lightmap(level: str, key: str) -> List[LightmapTile] | None:
+    try:
+        with open(lightmap_path(level), "rb") as file:
+            if file.read(len(LIGHTMAP_MAGIC)) != LIGHTMAP_MAGIC:
+                return None
+            version, cached_key, tiles = pickle.load(file)
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+        return None
+    if version != LIGHTMAP_VERSION or cached_key != key:
+        return None
+    return tiles
+
+
+def write_lightmap(level: str, key: str, tiles: List[LightmapTile]) -> None:
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(lightmap_path(level), "wb") as file:
+        file.write(LIGHTMAP_MAGIC)
+        pickle.dump((LIGHTMAP_VERSION, key, tiles), file, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+class BakedLightLayer(LightLayer):
+    # a light layer that adds a prebaked map of the static lights under the live ones,
+    # without a lightmap it draws just like a LightLayer. the light buffer follows the render scale,
+    # lights are soft enough that nobody sees the difference, what they light stays at full size
+    # it leans on LightLayer internals, arcade is pinned for it in requirements.txt
+    def __init__(self, width: int, height: int) -> None:
+        super().__init__(width, height)
+        self.lightmap: arcade.SpriteList | None = None
+        self.size = (width, height)
+        self.light_size = (width, height)
+
+    def resize(self, width: int, height: int) -> None:
+        super().resize(width, height)
+        self.size = (width, height)
+        self.light_size = (width, height)
+
+    def match_scale(self) -> None:
+        size = scaled_size(self.size, RENDER_SCALE.scale)
+        if size != self.light_size:
+            self.light_size = size
+            self._light_buffer = self.ctx.framebuffer(color_attachments=self.ctx.texture(size, components=3))
+
+    def set_lightmap(self, level: str, lights: List[Light]) -> None:
+        if not lights:
+            self.lightmap = None
+            return
+        key = lightmap_key(lights)
+        cached = LIGHTMAPS.get(level)
+        if cached is not None and cached[0] == key:
+            self.lightmap = cached[1]
+            return
+        tiles = read_lightmap(level, key)
+        if tiles is None:
+            tiles = self.bake(lights)
+            write_lightmap(level, key, tiles)
+        # its own atlas, the tiles are too big to share the one everything else is in
+        self.lightmap = arcade.SpriteList(atlas=DefaultTextureAtlas((LIGHTMAP_TILE, LIGHTMAP_TILE)))
+        for i, ((left, bottom, width, height), png) in enumerate(tiles):
+            texture = arcade.Texture(Image.open(io.BytesIO(png)).convert("RGBA"), hash=f"lightmap-{level}-{key}-{i}")
+            sprite = arcade.Sprite(texture, center_x=left + width / 2, center_y=bottom + height / 2)
+            sprite.width = width
+            sprite.height = height
+            self.lightmap.append(sprite)
+        LIGHTMAPS[level] = (key, self.lightmap)
+
+    def bake(self, lights: List[Light]) -> List[LightmapTile]:
+        left = min(light.position[0] - light.radius for light in lights)
+        bottom = min(light.position[1] - light.radius for light in lights)
+        right = max(light.position[0] + light.radius for light in lights)
+        top = max(light.position[1] + light.radius for light in lights)
+        span = LIGHTMAP_TILE / LIGHTMAP_SCALE # world units per full tile
+        tiles = []
+        for tile_bottom in range(math.floor(bottom), math.ceil(top), math.ceil(span)):
+            for tile_left in range(math.floor(left), math.ceil(right), math.ceil(span)):
+                width = min(LIGHTMAP_TILE, math.ceil((right - tile_left) * LIGHTMAP_SCALE))
+                height = min(LIGHTMAP_TILE, math.ceil((top - tile_bottom) * LIGHTMAP_SCALE))
+                rect = (tile_left, tile_bottom, width / LIGHTMAP_SCALE, height / LIGHTMAP_SCALE)
+                tiles.append((rect, self.bake_tile(lights, rect, (width, height))))
+        self._rebuild = True # the light buffer was borrowed, the live lights have to go back in
+        return tiles
+
+    def bake_tile(self, lights: List[Light], rect: Tuple[float, float, float, float], size: Tuple[int, int]) -> bytes:
+        left, bottom, width, height = rect
+        fbo = self.ctx.framebuffer(color_attachments=self.ctx.texture(size, components=3))
+        camera = arcade.camera.Camera2D(viewport=arcade.LBWH(0, 0, *size),
+                                        projection=arcade.LRBT(-width / 2, width / 2, -height / 2, height / 2),
+                                        position=(left + width / 2, bottom + height / 2), render_target=fbo)
+        data = array("f")
+        for light in lights:
+            data.extend(light.position)
+            data.append(light.radius)
+            data.append(light._attenuation)
+            data.extend(light._color)
+        while self._buffer.size < len(data) * 4:
+            self._buffer.orphan(double=True)
+        self._buffer.write(data=data)
+        with camera.activate():
+            fbo.clear()
+            self._light_program["offset"] = (0, 0)
+            self.ctx.enable(self.ctx.BLEND)
+            self.ctx.blend_func = self.ctx.BLEND_ADDITIVE
+            self._vao.render(self._light_program, mode=self.ctx.TRIANGLE_STRIP, instances=len(lights))
+            self.ctx.blend_func = self.ctx.BLEND_DEFAULT
+        image = Image.frombytes("RGB", size, fbo.read(components=3)).transpose(Image.Transpose.FLIP_TOP_BOTTOM)
+        out = io.BytesIO()
+        image.save(out, "png")
+        return out.getvalue()
+
+    def draw(self, position: Tuple[float, float] = (0, 0), target=None, ambient_color=(64, 64, 64)) -> None:
+        # same as LightLayer.draw, except the light buffer starts out with the lightmap instead of black
+        if target is None:
+            target = self.window
+        self.match_scale()
+
+        if self._rebuild and len(self._lights) > 0:
+            data = array("f")
+            for light in self._lights:
+                data.extend(light.position)
+                data.append(light.radius)
+                data.append(light._attenuation)
+                data.extend(light._color)
+            while self._buffer.size < len(data) * 4:
+                self._buffer.orphan(double=True)
+            self._buffer.write(data=data)
+            self._rebuild = False
+
+        self._light_buffer.use()
+        self._light_buffer.clear()
+        self.ctx.enable(self.ctx.BLEND)
+        if self.lightmap is not None:
+            self.lightmap.draw(blend_function=self.ctx.BLEND_ADDITIVE)
+        if len(self._lights) > 0:
+            self._light_program["offset"] = position
+            self.ctx.blend_func = self.ctx.BLEND_ADDITIVE
+            self._vao.render(self._light_program, mode=self.ctx.TRIANGLE_STRIP, instances=len(self._lights))
+        self.ctx.blend_func = self.ctx.BLEND_DEFAULT
+
+        target.use()
+        self._combine_program["diffuse_buffer"] = 0
+        self._combine_program["light_buffer"] = 1
+        self._combine_program["ambient"] = ambient_color[:3]
+        self._fbo.color_attachments[0].use(0)
+        self._light_buffer.color_attachments[0].use(1)
+        self._quad_fs.render(self._combine_program)
+
+
+class LightManager:
+    # decides which lights the light layer gets to render. static lights sit in a grid by their center,
+    # only the ones whose circle reaches into the view are handed to the layer. dynamic lights follow
+    # the player around and always go in
+    def __init__(self, light_layer: LightLayer, cell_size: float) -> None:
+        self.light_layer = light_layer
+        self.cell_size = cell_size
+        self.cells: Dict[Tuple[int, int], List[Light]] = {}
+        self.static_count = 0
+        self.max_radius = 0.0
+        self.dynamic: List[Light] = []
+        self.submitted: Set[Light] = set() # what's in the layer right now
+        self.visible = 0
+        self.culled = 0
+        self.baked = 0
+
+    def cell(self, x: float, y: float) -> Tuple[int, int]:
+        return (math.floor(x / self.cell_size), math.floor(y / self.cell_size))
+
+    def add_static(self, light: Light) -> None:
+        self.cells.setdefault(self.cell(*light.position), []).append(light)
+        self.static_count += 1
+        self.max_radius = max(self.max_radius, light.radius)
+
+    def bake(self, level: str) -> None:
+        # every static light goes into the layer's lightmap, from then on only the dynamic ones are drawn live
+        lights = [light for cell in self.cells.values() for light in cell]
+        self.light_layer.set_lightmap(level, lights)
+        self.cells = {}
+        self.static_count = 0
+        self.baked = len(lights)
+
+    def add_dynamic(self, light: Light) -> None:
+        self.dynamic.append(light)
+        self.submit(light)
+
+    def remove_dynamic(self, light: Light) -> None:
+        self.dynamic.remove(light)
+        if light in self.submitted:
+            self.submitted.remove(light)
+            self.light_layer.remove(light)
+
+    def submit(self, light: Light) -> None:
+        if light not in self.submitted:
+            self.submitted.add(light)
+            self.light_layer.add(light)
+
+    def update(self, position: Tuple[float, float], size: Tuple[float, float], margin: float) -> None:
+        # position is the center of the view, like the camera's
+        left = position[0] - size[0] / 2 - margin
+        right = position[0] + size[0] / 2 + margin
+        bottom = position[1] - size[1] / 2 - margin
+        top = position[1] + size[1] / 2 + margin
+        visible = set(self.dynamic)
+        # a light can reach into the view from a cell outside it, look as far as the biggest one reaches
+        cell_left, cell_bottom = self.cell(left - self.max_radius, bottom - self.max_radius)
+        cell_right, cell_top = self.cell(right + self.max_radius, top + self.max_radius)
+        for cx in range(cell_left, cell_right + 1):
+            for cy in range(cell_bottom, cell_top + 1):
+                for light in self.cells.get((cx, cy), ()):
+                    x, y = light.position
+                    radius = light.radius
+                    if x + radius >= left and x - radius <= right and y + radius >= bottom and y - radius <= top:
+                        visible.add(light)
+        # the layer re-uploads all of its lights whenever one comes or goes, so only touch it on a change
+        if visible != self.submitted:
+            for light in self.submitted - visible:
+                self.light_layer.remove(light)
+            for light in visible - self.submitted:
+                self.light_layer.add(light)
+            self.submitted = visible
+        self.visible = len(visible)
+        self.culled = self.static_count + len(self.dynamic) - self.visible
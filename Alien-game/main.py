@@ -1,83 +1,109 @@
+import time
+STARTUP_START = time.perf_counter()
+
 import arcade
 import random
-import math
 import pymunk
-from arcade import SpriteList
 
 from arcade.future.light import Light, LightLayer
 from pyglet.graphics import Batch
-from typing import Tuple
+from typing import Iterator, List, Tuple
 
 from constants import *
 from extra_views import MainMenu, PauseView
 from util import *
+from settings import SETTINGS
+from assets import ASSETS
+from sound_bank import SOUNDS
+from textures import TEXTURES
 from player_logic import Player
-from objects import Checkpoint, RaceEnd, Respawn, TimerDisplay, TextDisplay
+from objects import CHECKPOINT_PARTICLES, Checkpoint, RaceEnd, Respawn, TimerDisplay, TextDisplay
+from particles import PARTICLES
+from static_geometry import add_static_rects
+from triggers import TriggerVolumes
+from platforms import PlatformController
+from activation import ActivationGrid
+from lighting import BakedLightLayer, LightManager
+from render_scale import RENDER_SCALE
+from starfield import Starfield
+from replay import TRACKED_KEYS, InputRecorder, ReplayHeader, TickInput
+from ghost import GhostRecorder, GhostRunner, load_ghost
+from hud_timer import SegmentTimer
+from tile_chunks import ChunkedLayer
+from level_cache import PREFETCHER, PreparedLevel, make_sprite_list
 
 
 class GameView(arcade.View):
-    def __init__(self) -> None:
-        super().__init__()
+    def __init__(self, headless: bool = False) -> None:
+        # headless only runs the simulation: no window, no GL, nothing that exists just to be looked at
+        super().__init__(HeadlessWindow(SCREEN_WIDTH, SCREEN_HEIGHT) if headless else None)
+        self.headless = headless
         self.keys_pressed: set = set()
         self.level: str | None = None
         self.time: float = 0
         self.freeze: bool = True
         self.main_menu: MainMenu | None = None
         self.light_layer: LightLayer | None = None
-        with open("assets/shaders/stars_shader.glsl", "r", encoding="utf-8") as file:
-            self.stars_shader = arcade.experimental.Shadertoy((int(self.width), int(self.height)), file.read())
+        self.lights: LightManager | None = None
+        self.camera_position: Tuple[float, float] = (self.width / 2, self.height / 2)
+        self.race_log: List[Tuple[str, int, float]] = [] # (level, race id, time) of every finished race
+        self.playback: Iterator[TickInput] | None = None
+        self.ghost: GhostRunner | None = None
+        self.ghost_recorder: GhostRecorder | None = None
+        if headless:
+            self.stars_shader = None
+            self.world_camera = None
+            self.ui_camera = None
+            return
+        self.stars_shader = Starfield((int(self.width), int(self.height)))
         self.world_camera = arcade.camera.Camera2D()
         self.ui_camera = arcade.camera.Camera2D()
 
-    def setup(self, level: str) -> None:
+    def setup(self, level: str, prepared: PreparedLevel | None = None) -> None:
+        if prepared is None:
+            prepared = PREFETCHER.take(level) # instant if the level was prefetched
+        level_data = prepared.level
+        self.stop_ghost()
+        self.ghost_recorder = None
+        PARTICLES.clear() # the last level's are somewhere in the wrong world
+
         self.all_sprites = arcade.SpriteList()
         self.freeze = False
 
         self.level = level
-        tile_map = arcade.load_tilemap(f"assets/levels/{self.level}.tmx")
 
-        self.light_layer = LightLayer(int(self.width), int(self.height))
+        self.light_layer = None if self.headless else BakedLightLayer(int(self.width), int(self.height))
+        self.lights = None if self.headless else LightManager(self.light_layer, ACTIVATION_CELL)
 
-        self.special_list = tile_map.sprite_lists["special"]
         self.level_end_list = arcade.SpriteList(use_spatial_hash=True)
         self.teleporter_list = arcade.SpriteList(use_spatial_hash=True)
-        self.text_displays = arcade.SpriteList()
+        # every display's black screen in one sprite list and all of their text in one batch, one draw each
+        self.screen_list = arcade.SpriteList()
+        self.text_batch = Batch()
 
         self.player: Player | None = Player(self)
 
-        special: arcade.Sprite
-        for special in self.special_list:
-            type = special.properties["type"]
-            if type == "player_spawn":
-                self.player.bottom = special.bottom
-                self.player.center_x = special.center_x
-            if type == "level_end":
-                special.send_to = special.properties["send_to"]
-                special.properties = None
-                self.level_end_list.append(special)
-            elif type == "text_display":
-                text = special.properties["text"]
-                color: Tuple[int, int, int, int] = tuple(int(i)for i in special.properties["color"].split("."))
-                pos = special.position
-                radius = 200
-                mode = 'soft'
-                light2 = Light(pos[0], pos[1], radius, color, mode)
-                self.light_layer.add(light2)
-                draw_screen = special.properties["draw_screen"]
-                font_size = special.properties["font_size"]
-                size = (special.width, special.height)
-                screen = TextDisplay(pos, size, text, color, font_size, draw_screen)
-                self.text_displays.append(screen)
-            elif type == "teleporter":
-                special.send_to = special.properties["send_to"]
-                special.id = special.properties["id"]
-                color = TELEPORTER_LIGHT
-                pos = special.position
-                radius = 200
-                mode = 'soft'
-                light = Light(pos[0], pos[1], radius, color, mode)
-                self.light_layer.add(light)
-                self.teleporter_list.append(special)
+        if prepared.spawn is not None:
+            self.player.bottom = prepared.spawn.bottom
+            self.player.center_x = prepared.spawn.center_x
+
+        for record, level_end in zip(level_data.level_ends, prepared.level_ends):
+            level_end.send_to = record.send_to
+            level_end.properties = None
+            self.level_end_list.append(level_end)
+
+        for record in level_data.text_displays if not self.headless else ():
+            pos = (record.center_x, record.center_y)
+            self.add_light(pos, 200, record.color)
+            size = (record.width, record.height)
+            screen = TextDisplay(pos, size, record.text, self.text_batch, record.color, record.font_size, record.draw_screen)
+            self.screen_list.append(screen)
+
+        for record, teleporter in zip(level_data.teleporters, prepared.teleporters):
+            teleporter.send_to = record.send_to
+            teleporter.id = record.id
+            self.add_light(teleporter.position, 200, TELEPORTER_LIGHT)
+            self.teleporter_list.append(teleporter)
 
         self.teleporter_dict = {}
         for teleporter1 in self.teleporter_list:
@@ -85,24 +111,17 @@ class GameView(arcade.View):
                 if teleporter1.send_to == teleporter2.id:
                     self.teleporter_dict[teleporter1.id] = teleporter2
 
-        radius = 500
-        mode = 'soft'
-        color = PLAYER_LIGHT
-        self.player_light = Light(self.player.center_x, self.player.center_y, radius, color, mode)
-
-        self.light_layer.add(self.player_light)
+        self.player_light = self.add_light(self.player.position, 500, PLAYER_LIGHT, static=False)
 
         self.player_list = arcade.SpriteList()
         self.player_list.append(self.player)
         self.all_sprites.append(self.player)
 
 
-        self.wall_list = tile_map.sprite_lists["walls"]
-        self.background_list = tile_map.sprite_lists.get("background", SpriteList(use_spatial_hash=True))
-        self.collision_list = tile_map.sprite_lists["collisions"]
-        self.laser_list = tile_map.sprite_lists.get("lasers", SpriteList(use_spatial_hash=True))
+        self.collision_list = make_sprite_list(prepared.collisions)
+        self.laser_list = prepared.tile_list("lasers")
         self.checkpoint_list = arcade.SpriteList(use_spatial_hash=True)
-        self.platform_list = tile_map.sprite_lists.get("platforms", SpriteList())
+        self.platform_list = make_sprite_list(prepared.platforms) # boundaries are already in world coordinates
         self.end_list = arcade.SpriteList(use_spatial_hash=True)
         self.display_list = arcade.SpriteList()
 
@@ -110,76 +129,48 @@ class GameView(arcade.View):
         self.cur_race_timer: float = 0
 
         self.cur_checkpoint: Checkpoint | None = None
-        for platform in self.platform_list:
-            left, right = platform.left, platform.right
-            bottom, top = platform.bottom, platform.top
-            platform.boundary_left = left + platform.boundary_left * 64
-            platform.boundary_top = top + platform.boundary_top * 64
-            platform.boundary_right = right + platform.boundary_right * 64
-            platform.boundary_bottom = bottom + platform.boundary_bottom * 64
-
-        displays = tile_map.sprite_lists.get("displays", SpriteList(use_spatial_hash=True))
-        for display in displays:
-            pos = display.position
-            size = (display.width, display.height)
-            race_id = display.properties["race_id"]
-            radius = 200
-            mode = 'soft'
-            color = DISPLAY_LIGHT
-            light1 = Light(pos[0], pos[1], radius, color, mode)
-            self.light_layer.add(light1)
-            self.display_list.append(TimerDisplay(pos, size, race_id, self.level))
-
-        checkpoints = tile_map.sprite_lists.get("checkpoints", SpriteList(use_spatial_hash=True))
-        for checkpoint in checkpoints:
-            pos = checkpoint.position
-            radius = 150
-            mode = 'soft'
-            color = CHECKPOINT_LIGHT_OFF
-            light = Light(pos[0], pos[1], radius, color, mode)
-            self.light_layer.add(light)
+
+        for record in level_data.timer_displays if not self.headless else (): # race times still go to race_log
+            pos = (record.center_x, record.center_y)
+            size = (record.width, record.height)
+            self.add_light(pos, 200, DISPLAY_LIGHT)
+            display = TimerDisplay(pos, size, record.race_id, self.level, self.text_batch)
+            self.display_list.append(display)
+            self.screen_list.append(display)
+
+        for record in level_data.checkpoints:
+            pos = (record.center_x, record.center_y)
+            self.add_light(pos, 150, CHECKPOINT_LIGHT_OFF)
             self.checkpoint_list.append(Checkpoint(pos))
 
-        ends = tile_map.sprite_lists.get("ends", SpriteList(use_spatial_hash=True))
-        for end in ends:
-            pos = end.position
-            race = end.properties["race_id"]
-            rtype = end.properties["type"]
-            self.end_list.append(RaceEnd(pos, rtype, race))
+        if self.lights is not None and SETTINGS.get("baked_lights", True):
+            self.lights.bake(level) # none of the lights so far ever move or change
 
-        self.all_sprites.extend(self.laser_list)
-        self.all_sprites.extend(self.wall_list)
+        for record in level_data.race_ends:
+            pos = (record.center_x, record.center_y)
+            self.end_list.append(RaceEnd(pos, record.type, record.race_id))
 
-        self.mouse_pos = (0, 0)
+        # the tiles never move, only the chunks around the camera are drawn. the player goes under lasers and walls
+        self.background_chunks = ChunkedLayer(TILE_CHUNK_SIZE)
+        self.tile_chunks = ChunkedLayer(TILE_CHUNK_SIZE)
+        if not self.headless:
+            self.background_chunks.extend(prepared.visible_tiles("background"))
+            self.tile_chunks.extend(prepared.visible_tiles("lasers"))
+            self.tile_chunks.extend(prepared.visible_tiles("walls"))
 
-        self.ui_list = arcade.SpriteList()
+        # displays and race ends only get updated near the camera, checkpoint particles are up to PARTICLES
+        self.activation = ActivationGrid(ACTIVATION_CELL, self.time)
+        self.activation.extend(self.display_list)
+        self.activation.extend(self.end_list)
+
+        self.mouse_pos = (0, 0)
 
         self.windup = 0
         self.visual_timer = 0
         self.timer_bleep = 0
         self.mini_timer_bleep = 0
-        self.timer_batch = Batch()
-        arcade.load_font("assets/Seven Segment.ttf")
-        self.timer_text_bckgrnd0 = arcade.Text(f"0:00:00",
-                                               x=100, y=60,
-                                               anchor_x="center", anchor_y="center", batch=self.timer_batch,
-                                               color=(0, 0, 0, 64), font_name="Seven Segment",
-                                               font_size=42)
-        self.timer_text = arcade.Text(f"0:00:00",
-                                      x=100, y=60,
-                                      anchor_x="center", anchor_y="center", batch=self.timer_batch,
-                                      color=arcade.color.BLACK, font_name="Seven Segment",
-                                      font_size=42)
-        self.corner_textures = [arcade.load_texture(f"assets/timer_corner/timer_corner{i}.png") for i in range(6)]
-        self.corner = arcade.Sprite("assets/timer_corner/timer_corner0.png")
-        self.ui_list.append(self.corner)
-        self.corner.scale = 0.7
-        self.corner.left = 0
-        self.corner.bottom = 0
-        self.corner.visible = False
-        self.timer_text_bckgrnd0.visible = False
-        self.timer_text.visible = False
-        self.corner_update()
+        if not self.headless:
+            self.setup_hud()
 
         self.physics_engine = arcade.PymunkPhysicsEngine(damping=DEFAULT_DAMPING, gravity=GRAVITY_VECTOR)
         self.physics_engine.add_sprite(
@@ -193,12 +184,12 @@ class GameView(arcade.View):
             max_vertical_velocity=PLAYER_MAX_VERT_SPEED,
             elasticity=0,
         )
-        self.physics_engine.add_sprite_list(
-            self.collision_list,
-            body_type=arcade.PymunkPhysicsEngine.STATIC,
-            collision_type="wall",
-            friction=WALL_FRICTION,
-        )
+        # the collision layer goes in as static boxes on the space's static body instead of a body per object,
+        # self.collision_list is only kept around for the debug view
+        if "wall" not in self.physics_engine.collision_types:
+            self.physics_engine.collision_types.append("wall")
+        add_static_rects(self.physics_engine.space, prepared.wall_rects, WALL_FRICTION,
+                         self.physics_engine.collision_types.index("wall"))
         self.physics_engine.add_sprite_list(
             self.platform_list,
             body_type=arcade.PymunkPhysicsEngine.KINEMATIC,
@@ -206,19 +197,6 @@ class GameView(arcade.View):
             friction=1.0,
         )
 
-        for wall in self.collision_list:  # fix for weird collision
-            width, height = wall.width / 2, wall.height / 2
-            object = self.physics_engine.get_physics_object(wall)
-            body = object.body
-            old_shape = object.shape
-            ffriction = old_shape.friction
-            shape = pymunk.Poly(body, [(-width, -height), (-width, height),
-                                       (width, height), (width, -height)])
-            shape.friction = ffriction
-            shape.collision_type = self.physics_engine.collision_types.index("wall")
-            self.physics_engine.space.remove(old_shape)
-            self.physics_engine.space.add(shape)
-
         for wall in self.platform_list:  # fix for weird collision
             width, height = wall.width / 2, wall.height / 2
             object = self.physics_engine.get_physics_object(wall)
@@ -232,6 +210,8 @@ class GameView(arcade.View):
             self.physics_engine.space.remove(old_shape)
             self.physics_engine.space.add(shape)
 
+        self.platform_controller = PlatformController(self.physics_engine, self.platform_list, PLATFORM_SPEED_SCALE)
+
         self.physics_engine.add_sprite_list(
             self.laser_list,
             body_type=arcade.PymunkPhysicsEngine.STATIC,
@@ -241,25 +221,69 @@ class GameView(arcade.View):
             "player", "laser", pre_handler=self.respawn_player,
         )
 
+        self.triggers = TriggerVolumes(self.physics_engine)
+        self.triggers.add("checkpoint", self.checkpoint_list)
+        self.triggers.add("race_end", self.end_list)
+        self.triggers.add("level_end", self.level_end_list)
+        self.triggers.add("teleporter", self.teleporter_list)
+
+        # fixed step simulation, drawing happens somewhere between the last two ticks
+        self.tick_rate = SETTINGS.get("physics_rate", PHYSICS_TICK_RATE)
+        self.tick = 1 / self.tick_rate
+        self.accumulator = 0
+        if self.world_camera is not None:
+            self.camera_position = tuple(self.world_camera.position)
+        # everything the player does from here on, a finished race saves it next to its best time
+        self.recorder = InputRecorder(level, self.tick_rate, self.camera_position)
+        self.playback = None
+        self.race_start_tick = 0
+        self.interpolated_sprites = [self.player, *self.platform_list]
+        self.store_previous_positions()
+
+    def setup_hud(self):
+        self.ui_list = arcade.SpriteList()
+        font_name = ASSETS.get("seven_segment_font")
+        self.corner_textures = [TEXTURES.load_texture(f"assets/timer_corner/timer_corner{i}.png") for i in range(6)]
+        self.corner = arcade.Sprite(self.corner_textures[0])
+        self.ui_list.append(self.corner)
+        self.corner.scale = 0.7
+        self.corner.left = 0
+        self.corner.bottom = 0
+        self.corner.visible = False
+        # digit sprites in the same list as the corner, the whole hud is one draw
+        self.timer_text_bckgrnd0 = SegmentTimer(self.ui_list, (100, 60), font_name, 42, (0, 0, 0, 64))
+        self.timer_text = SegmentTimer(self.ui_list, (100, 60), font_name, 42, arcade.color.BLACK)
+        self.timer_text_bckgrnd0.visible = False
+        self.timer_text.visible = False
+        self.place_hud()
+        self.corner_update()
+
+    def place_hud(self):
+        # the ui camera only changes on a resize, no need to convert every frame
+        x, y = self.world_to_cam((0, 0), self.ui_camera)
+        self.timer_position = (x + 100, y + 60)
+        self.corner.left = x
+        self.corner.bottom = y
+
+    def add_light(self, position: Tuple[float, float], radius: float, color, static: bool = True) -> Light:
+        light = Light(position[0], position[1], radius, color, 'soft')
+        if self.lights is not None:
+            if static:
+                self.lights.add_static(light) # only drawn while it's in view
+            else:
+                self.lights.add_dynamic(light)
+        return light
+
     def respawn_player(self, *args):
         self.player.respawn_at_chkpnt()
         return False
 
     def corner_update(self):
         ok = min((self.visual_timer ** 0.5) * 0.5, 1)
-        x, y = self.world_to_cam((100, 60), self.ui_camera)
-        x1, y1 = self.world_to_cam((0, 0), self.ui_camera)
-        self.timer_text_bckgrnd0.x = x + random.uniform(-10, 10) * ok
-        self.timer_text_bckgrnd0.y = y + random.uniform(-10, 10) * ok
-        self.timer_text.x = x
-        self.timer_text.y = y
-        self.corner.left = x1
-        self.corner.bottom = y1
-        m = int(self.cur_race_timer // 60)
-        s = str(math.floor(self.cur_race_timer % 60)).rjust(2, "0")
-        ms = str(self.cur_race_timer - math.floor(self.cur_race_timer))[2:4]
-        self.timer_text_bckgrnd0.text = f"{m}:{s}:{ms}"
-        self.timer_text.text = f"{m}:{s}:{ms}"
+        self.timer_text_bckgrnd0.move(self.timer_position, (random.uniform(-10, 10) * ok, random.uniform(-10, 10) * ok))
+        self.timer_text.move(self.timer_position)
+        self.timer_text_bckgrnd0.set_time(self.cur_race_timer)
+        self.timer_text.set_time(self.cur_race_timer)
         frame = int(self.visual_timer * 15  * ok) % 6
         self.corner.texture = self.corner_textures[frame]
 
@@ -268,28 +292,29 @@ class GameView(arcade.View):
         self.ui_camera.match_window(viewport=True, projection=True)
         self.stars_shader.resize((int(self.width), int(self.height)))
         self.light_layer.resize(int(self.width), int(self.height))
+        self.place_hud()
 
     def on_draw(self) -> bool | None:
         self.clear()
+        RENDER_SCALE.frame()
 
         # Draw the light layer to the screen.
         # This fills the entire screen with the lit version
         # of what we drew into the light layer above.
         self.world_camera.use()
         if self.level is not None:
+            view = (self.width, self.height)
             with self.light_layer:
                 self.stars_shader.render(time=self.time)
-                self.background_list.draw()
-                for display in self.display_list:
-                    display.draw()
-                for display in self.text_displays:
-                    display.draw()
+                self.background_chunks.draw(self.world_camera.position, view, TILE_CHUNK_MARGIN)
+                self.screen_list.draw()
+                self.text_batch.draw()
                 self.checkpoint_list.draw()
                 self.teleporter_list.draw()
-                for checkpoint in self.checkpoint_list:
-                    checkpoint.draw()
+                PARTICLES.draw(CHECKPOINT_PARTICLES)
                 self.platform_list.draw()
                 self.all_sprites.draw()
+                self.tile_chunks.draw(self.world_camera.position, view, TILE_CHUNK_MARGIN)
                 self.player.draw()
                 self.end_list.draw()
         else:
@@ -307,123 +332,233 @@ class GameView(arcade.View):
             arcade.draw_line(*self.player.position , *mouse, arcade.color.PUCE)
             arcade.draw_rect_outline(box_player, arcade.color.BLACK)
             arcade.draw_point(*cam_pos, arcade.color.RED, size=2)
+            arcade.draw_text(TEXTURES.report(), x=cam_pos[0] - self.width / 2, y=cam_pos[1] - 20,
+                             anchor_x="left", anchor_y="center")
+            arcade.draw_text(f"lights: {self.lights.visible} visible {self.lights.culled} culled {self.lights.baked} baked",
+                             x=cam_pos[0] - self.width / 2, y=cam_pos[1] - 40, anchor_x="left", anchor_y="center")
+            arcade.draw_text(RENDER_SCALE.report(), x=cam_pos[0] - self.width / 2, y=cam_pos[1] - 60,
+                             anchor_x="left", anchor_y="center")
+            arcade.draw_text(PARTICLES.report(), x=cam_pos[0] - self.width / 2, y=cam_pos[1] - 80,
+                             anchor_x="left", anchor_y="center")
+            chunks = (self.background_chunks, self.tile_chunks)
+            arcade.draw_text(f"chunks: {sum(c.drawn for c in chunks)}/{sum(len(c.chunks) for c in chunks)} drawn "
+                             f"tiles: {sum(c.drawn_sprites for c in chunks)}/{sum(c.sprite_count for c in chunks)}",
+                             x=cam_pos[0] - self.width / 2, y=cam_pos[1] - 100, anchor_x="left", anchor_y="center")
         self.ui_camera.use()
         if self.level is not None:
             self.ui_list.draw()
-            self.timer_batch.draw()
 
-    def update_world_camera(self):
+    def update_world_camera(self, delta_time: float = 1/60):
         box_player = arcade.rect.XYWH(*self.player.position, 200, 150)
+        follow = 1 - (1 - 0.22) ** (delta_time * 60) # 0.22 per frame at 60 fps, whatever the tick rate
 
-        old_x, old_y = self.world_camera.position
-        cam_x, cam_y = self.world_camera.position
+        old_x, old_y = self.camera_position
+        cam_x, cam_y = self.camera_position
         cam_x = max(min(cam_x, box_player.right), box_player.left)
         cam_y = max(min(cam_y, box_player.top), box_player.bottom)
         if old_x != cam_x:
-            cam_x = arcade.math.lerp(old_x, cam_x, 0.22)
+            cam_x = arcade.math.lerp(old_x, cam_x, follow)
         if old_y != cam_y:
-            cam_y = arcade.math.lerp(old_y, cam_y, 0.22)
-        self.world_camera.position = (cam_x, cam_y)
-
-    def update_non_phys_collisions(self): # all that uses collision but not physics, todo: maybe use pymunk sensors somehow (that should improve performance IF i will need it)
-        checkpoints_collisions = arcade.check_for_collision_with_list(self.player, self.checkpoint_list)
-        checkpoint: Checkpoint
-        for checkpoint in checkpoints_collisions:
-            if not checkpoint.active and self.cur_race is None:
-                checkpoint.activate()
-                self.cur_checkpoint = checkpoint
-                for ccheckpoint in self.checkpoint_list:
-                    if ccheckpoint != self.cur_checkpoint:
-                        ccheckpoint.deactivate()
-
-        ends_collisions = arcade.check_for_collision_with_list(self.player, self.end_list)
-        node: RaceEnd
-        for node in ends_collisions:
-            type, race_id = node.get_action()
-            if type == EndTypes.START and self.cur_race is None:
-                self.cur_race = race_id
-                self.cur_checkpoint = Respawn(node.position)
-                sound = arcade.Sound("assets/sounds/race_start.wav")
-                sound.play(loop=False, volume=0.5 * read_settings().get("volume", 100) / 100)
-                for checkpoint in self.checkpoint_list:
-                    checkpoint.deactivate()
-                self.cur_race_timer = 0
-            elif type == EndTypes.END and self.cur_race == race_id:
-                self.flush_display_time(self.cur_race_timer, self.cur_race)
-                self.unique_race_triggers(self.cur_race)
-                self.cur_race = None
-
-        level_end_collision = arcade.check_for_collision_with_list(self.player, self.level_end_list)
-        if level_end_collision:
-            level_end = level_end_collision[0]
-            if level_end.send_to == "menu":
+            cam_y = arcade.math.lerp(old_y, cam_y, follow)
+        self.camera_position = (cam_x, cam_y)
+
+    def update_non_phys_collisions(self): # all that uses collision but not physics, the sensors note what the player walked into during the step
+        for kind, sprite in self.triggers.pop_entered():
+            if kind == "checkpoint":
+                self.enter_checkpoint(sprite)
+            elif kind == "race_end":
+                self.enter_race_end(sprite)
+            elif kind == "teleporter":
+                self.enter_teleporter(sprite)
+            elif kind == "level_end":
+                self.enter_level_end(sprite)
+                return # the level is gone, so are the rest of the events
+
+    def enter_checkpoint(self, checkpoint: Checkpoint):
+        if not checkpoint.active and self.cur_race is None:
+            if self.cur_checkpoint is not None:
+                self.cur_checkpoint.deactivate() # only the current one is ever active
+            checkpoint.activate()
+            self.cur_checkpoint = checkpoint
+
+    def restart_race(self):
+        # the race starting, or starting over after a respawn. the timer, the replay's start, the ghost
+        # recording and the ghost itself all go back to zero together
+        self.cur_race_timer = 0
+        self.timer_bleep = 0
+        if self.cur_race is None:
+            return
+        self.race_start_tick = self.recorder.ticks
+        self.stop_ghost()
+        self.ghost_recorder = None
+        if not self.headless:
+            self.ghost_recorder = GhostRecorder(GHOST_SAMPLE_TICKS, self.tick)
+            self.ghost_recorder.start(self.player)
+            self.start_ghost(self.cur_race)
+
+    def enter_race_end(self, node: RaceEnd):
+        type, race_id = node.get_action()
+        if type == EndTypes.START and self.cur_race is None:
+            self.cur_race = race_id
+            if self.cur_checkpoint is not None:
+                self.cur_checkpoint.deactivate()
+            self.cur_checkpoint = Respawn(node.position)
+            SOUNDS.play("race_start", 0.5)
+            self.restart_race()
+        elif type == EndTypes.END and self.cur_race == race_id:
+            self.race_log.append((self.level, self.cur_race, self.cur_race_timer))
+            replay = self.recorder.to_bytes(self.cur_race, self.race_start_tick, self.cur_race_timer)
+            ghost = self.ghost_recorder.to_bytes() if self.ghost_recorder is not None else None
+            self.stop_ghost() # closes the ghost file before a new best overwrites it
+            self.flush_display_time(self.cur_race_timer, self.cur_race, replay, ghost)
+            self.ghost_recorder = None
+            self.unique_race_triggers(self.cur_race)
+            self.cur_race = None
+            # whatever we're still standing in was ignored during the race, give it another go
+            for checkpoint in self.triggers.touching["checkpoint"]:
+                self.enter_checkpoint(checkpoint)
+            for other in self.triggers.touching["race_end"]:
+                if other is not node:
+                    self.enter_race_end(other)
+
+    def enter_level_end(self, level_end: arcade.Sprite):
+        if level_end.send_to == "menu":
+            if self.main_menu is not None:
                 self.main_menu.manager.enable()
                 self.main_menu.on_resize(int(self.width), int(self.height))
                 self.main_menu.manager.on_resize(self.width, self.height)
                 self.window.show_view(self.main_menu)
-                self.level = None
-            else:
-                self.setup(level_end.send_to)
-
-        teleporter_collision = arcade.check_for_collision_with_list(self.player, self.teleporter_list)
-        if teleporter_collision:
-            teleporter = teleporter_collision[0]
-            id = teleporter.id
-            send_to = self.teleporter_dict.get(id, None)
-            if send_to is not None:
-                self.physics_engine.set_position(self.player, send_to.position)
-                sound = arcade.Sound("assets/sounds/teleporter.wav")
-                sound.play(loop=False, volume=0.5 * read_settings().get("volume", 100) / 100)
+            self.level = None
+        else:
+            self.setup(level_end.send_to)
+
+    def enter_teleporter(self, teleporter: arcade.Sprite):
+        send_to = self.teleporter_dict.get(teleporter.id, None)
+        if send_to is not None:
+            self.physics_engine.set_position(self.player, send_to.position)
+            SOUNDS.play("teleporter", 0.5)
+
+    def prefetch_level_ends(self):
+        # start loading the next level in the background once the player gets close to a way out
+        for level_end in self.level_end_list:
+            if level_end.send_to == "menu" or PREFETCHER.is_ready(level_end.send_to):
+                continue
+            if arcade.get_distance_between_sprites(self.player, level_end) < PREFETCH_DISTANCE:
+                PREFETCHER.request(level_end.send_to)
 
     def unique_race_triggers(self, race_id: int):  # this is for handling triggers upon race completion (not used)
         pass
 
-    def flush_display_time(self, cur_race_timer: float, cur_race: int):
+    def flush_display_time(self, cur_race_timer: float, cur_race: int, replay: bytes | None = None, ghost: bytes | None = None):
         display: TimerDisplay
         for display in self.display_list:
             if display.race_id == cur_race:
-                display.set_time(cur_race_timer)
-
-    def update_platforms(self, delta_time: float = 1/60):
-        for platform in self.platform_list:
-            if platform.change_x > 0 and \
-                    platform.right >= platform.boundary_right:
-                platform.change_x *= -1
-            elif platform.change_x < 0 and \
-                    platform.left <= platform.boundary_left:
-                platform.change_x *= -1
-            if platform.change_y > 0 and \
-                    platform.top >= platform.boundary_top:
-                platform.change_y *= -1
-            elif platform.change_y < 0 and \
-                    platform.bottom <= platform.boundary_bottom:
-                platform.change_y *= -1
-            velocity = (platform.change_x * 1 / delta_time, platform.change_y * 1 / delta_time)
-            self.physics_engine.set_velocity(platform, velocity)
+                display.set_time(cur_race_timer, replay, ghost)
 
-    def on_update(self, delta_time: float = 1/60):
-        if self.level is None or (self.freeze and self.level is not None):
+    def start_ghost(self, race_id: int):
+        # the best run so far races along, drawn like any other sprite, it never touches the physics
+        self.ghost = load_ghost(self.level, race_id)
+        if self.ghost is None:
             return
-        self.physics_engine.step(1 / 120)
-        self.update_platforms(1 / 120)
-        self.physics_engine.step(1 / 120)
-        self.update_platforms(1 / 120)
-        self.time += delta_time
+        self.all_sprites.insert(self.all_sprites.index(self.player), self.ghost) # behind the player
+        if self.lights is not None:
+            self.lights.add_dynamic(self.ghost.light)
 
+    def stop_ghost(self):
+        if self.ghost is None:
+            return
+        self.ghost.close()
+        self.ghost.remove_from_sprite_lists()
+        if self.lights is not None and self.ghost.light in self.lights.dynamic:
+            self.lights.remove_dynamic(self.ghost.light)
+        self.ghost = None
+
+    def store_previous_positions(self):
+        self.previous_positions = [sprite.position for sprite in self.interpolated_sprites]
+        self.previous_camera = self.camera_position
+
+    def restore_positions(self): # back to where the physics engine really has them
+        for sprite in self.interpolated_sprites:
+            sprite.position = self.physics_engine.get_physics_object(sprite).body.position
+
+    def interpolate(self, alpha: float):
+        for sprite, (old_x, old_y) in zip(self.interpolated_sprites, self.previous_positions):
+            x, y = sprite.position
+            sprite.position = (arcade.math.lerp(old_x, x, alpha), arcade.math.lerp(old_y, y, alpha))
+        old_x, old_y = self.previous_camera
+        x, y = self.camera_position
+        self.world_camera.position = (arcade.math.lerp(old_x, x, alpha), arcade.math.lerp(old_y, y, alpha))
         self.player_light.position = self.player.position
 
-        self.update_world_camera()
+    def activation_radius(self) -> float:
+        return max(self.width, self.height) / 2 + ACTIVATION_MARGIN
+
+    def start_playback(self, header: ReplayHeader, inputs: Iterator[TickInput]):
+        # call right after setup(), ticks then take their input from the replay instead of the mouse and keyboard
+        self.tick_rate = header.tick_rate
+        self.tick = 1 / header.tick_rate
+        self.playback = inputs
+
+    def tick_input(self) -> TickInput:
+        tick_input = None
+        if self.playback is not None:
+            tick_input = next(self.playback, None)
+            if tick_input is None:
+                self.playback = None
+        if tick_input is None:
+            tick_input = (self.mouse_world_pos(), {key for key in TRACKED_KEYS if key in self.keys_pressed})
+        self.recorder.record(*tick_input)
+        return tick_input
+
+    def fixed_update(self, delta_time: float):
+        self.store_previous_positions()
+        self.platform_controller.wake_near(self.camera_position, PLATFORM_WAKE_RADIUS, delta_time)
+        mouse, keys = self.tick_input()
+        self.player.update(mouse, keys, delta_time)
+        self.physics_engine.step(delta_time)
+        self.platform_controller.update(delta_time)
+        self.update_world_camera(delta_time)
+        if self.cur_race is not None:
+            self.cur_race_timer += delta_time # race times count simulated time, not frames
+            if self.ghost_recorder is not None:
+                self.ghost_recorder.record(self.player)
         self.update_non_phys_collisions()
 
-        self.display_list.update(delta_time)
-        self.checkpoint_list.update(delta_time)
-        self.end_list.update(delta_time)
+    def on_update(self, delta_time: float = 1/60):
+        if self.level is None or (self.freeze and self.level is not None):
+            return
+        self.restore_positions()
+        self.accumulator += delta_time
+        steps = 0
+        while self.accumulator >= self.tick - 1e-9: # a little slack so 1/60 frames don't alternate between 1 and 3 ticks
+            if steps >= MAX_PHYSICS_SUBSTEPS:
+                self.accumulator = 0 # way behind, let the game slow down instead of spiralling
+                break
+            self.accumulator -= self.tick
+            steps += 1
+            level = self.level
+            self.fixed_update(self.tick)
+            if self.level is None:
+                return
+            if self.level != level: # went through a level end, setup() started over
+                break
+        self.time += delta_time
+        self.prefetch_level_ends()
+        if self.headless:
+            PARTICLES.clear() # nobody will ever see these
+            return
+
+        alpha = min(max(self.accumulator / self.tick, 0), 1)
+        self.interpolate(alpha)
+        if self.ghost is not None: # the time the interpolated player is at
+            self.ghost.update_time(max(self.cur_race_timer - (1 - alpha) * self.tick, 0))
+        self.activation.update(self.world_camera.position, self.activation_radius(), self.time)
+        self.lights.update(self.world_camera.position, (self.width, self.height), LIGHT_CULL_MARGIN)
 
         self.visual_timer += delta_time * self.windup
         if self.cur_race is not None:
             self.timer_bleep += delta_time
             self.mini_timer_bleep += delta_time
-            self.cur_race_timer += delta_time
             self.windup += delta_time
             self.windup = min(1, self.windup)
         else:
@@ -442,14 +577,12 @@ class GameView(arcade.View):
             self.timer_text.visible = False
         if self.timer_bleep >= 1:
             self.timer_bleep -= 1
-            sound = arcade.Sound("assets/sounds/timer_bleep.wav")
-            sound.play(loop=False, volume=0.5 * read_settings().get("volume", 100) / 100)
+            SOUNDS.play("timer_bleep", 0.5)
         if self.mini_timer_bleep >= 0.05:
             self.mini_timer_bleep -= 0.05
-            sound = arcade.Sound("assets/sounds/timer_bleep.wav")
-            sound.play(loop=False, volume=0.1 * read_settings().get("volume", 100) / 100)
+            SOUNDS.play("timer_bleep", 0.1)
 
-        self.player.update(self.world_to_cam(self.mouse_pos, self.world_camera), self.keys_pressed, delta_time)
+        PARTICLES.update(delta_time, self.world_camera.position, (self.width, self.height))
         self.player.update_animation(delta_time)
 
     def on_key_press(self, symbol, modifiers):
@@ -480,6 +613,13 @@ class GameView(arcade.View):
             if arcade.key.R in self.keys_pressed:
                 self.keys_pressed.remove(arcade.key.R)
 
+    def mouse_world_pos(self) -> Tuple[float, float]:
+        # against the simulated camera, so input doesn't depend on where between two ticks the last frame was drawn
+        # whole pixels, so a recording holds exactly what the player got
+        x, y = self.mouse_pos
+        return (round(x + self.camera_position[0] - self.width / 2),
+                round(y + self.camera_position[1] - self.height / 2))
+
     def world_to_cam(self, xy: Tuple[float, float], camera: arcade.Camera2D) -> Tuple[float, float]:
         x, y = xy
         return (x + camera.position[0] - self.width / 2,
@@ -492,11 +632,26 @@ class GameView(arcade.View):
 
 
 if __name__ == "__main__":
+    startup = StartupTimer(STARTUP_START)
+    startup.mark("imports")
     game = arcade.Window(SCREEN_WIDTH, SCREEN_HEIGHT, "Alien game", resizable=True, vsync=True)
+    startup.mark("window")
+    SOUNDS.load()
+    startup.mark("sounds")
     game_view = GameView()
     main_menu = MainMenu(game_view)
     game_view.main_menu = main_menu
+    startup.mark("views")
     game.set_minimum_size(1, 2)
     arcade.set_background_color(arcade.color.BLACK)
+
+    def on_first_frame():  # pushed before the menu, so it runs right after the menu's on_draw
+        startup.mark("first frame")
+        game.remove_handler("on_draw", on_first_frame)
+        print(f"startup:\n{startup.report()}")
+
+    game.push_handlers(on_draw=on_first_frame)
     game.show_view(main_menu)
-    arcade.run()
\ No newline at end of file
+    arcade.run()
+    SOUNDS.stop_all()
+    SETTINGS.flush() # the window is closed, write out whatever the debounce is still holding
\ No newline at end of file
@@ -1,32 +1,31 @@
-import random
 import arcade
 import math
 from typing import Tuple, Dict
-from arcade.particles import (FadeParticle, Emitter, EmitInterval)
 from pyglet.graphics import Batch
 from constants import *
-from util import read_settings
+from sound_bank import SOUNDS
+from textures import TEXTURES
+from assets import ASSETS
+from particles import PARTICLES, ParticleEmitter, ParticlePreset, in_rect
+from replay import save_replay
+from ghost import save_ghost
 
 
-def checkpoint_mutator(p) -> None:
-    p.change_y += 0.03
-    p.change_x *= 0.96
-    p.change_y *= 0.98
+CHECKPOINT_PARTICLES = ParticlePreset(
+    name="checkpoint",
+    texture="checkpoint_particle",
+    velocity=in_rect(-1, 1, 0, 6),
+    offset=in_rect(-32, 32, -20, 0),
+    lifetime=(1.0, 1.5),
+    scale=(0.9, 1.1),
+    start_alpha=(225, 225),
+    gravity=0.03,
+    drag=(0.96, 0.98),
+)
 
 
-def make_checkpoint_particles(x: float | int, y: float | int) -> Emitter:
-    rect = arcade.rect.XYWH(0, -10, 64, 20)
-    return Emitter(center_xy=(x, y),
-        emit_controller=EmitInterval(0.02),
-        particle_factory=lambda e: FadeParticle(
-            filename_or_texture=CHECKPOINT_PARTICLE,
-            change_xy=(random.uniform(-1, 1), random.uniform(0, 6)),
-            center_xy=arcade.math.rand_in_rect(rect),
-            lifetime=random.uniform(1.0, 1.5),
-            scale=random.uniform(0.9, 1.1),
-            start_alpha=225, end_alpha=0,
-            mutation_callback=checkpoint_mutator,
-        ),)
+def make_checkpoint_particles(x: float | int, y: float | int) -> ParticleEmitter:
+    return PARTICLES.emitter(CHECKPOINT_PARTICLES, x, y, interval=0.02)
 
 
 class Respawn(arcade.Sprite):
@@ -46,30 +45,21 @@ class Respawn(arcade.Sprite):
 class Checkpoint(Respawn):
     def __init__(self, pos: Tuple[float, float]) -> None:
         super().__init__(pos)
-        texture = arcade.load_spritesheet("assets/levels/tileset.png")
         rect = arcade.rect.LBWH(576, 320, 64, 64)
-        texture = texture.get_texture(rect, y_up=True)
-        self.texture = texture
+        self.texture = TEXTURES.get_texture(TILESET, rect)
         self.reset_timer = False
-        self.emitter: Emitter | None = None
+        self.emitter: ParticleEmitter | None = None
 
     def activate(self) -> None:
         super().activate()
-        sound = arcade.load_sound("assets/sounds/activate_checkpoint.wav")
-        sound.play(loop=False, volume=0.5 * read_settings().get("volume", 100) / 100)
+        SOUNDS.play("activate_checkpoint", 0.5)
         self.emitter = make_checkpoint_particles(*self.position)
 
     def deactivate(self) -> None:
         super().deactivate()
-        self.emitter = None
-
-    def draw(self) -> None:
-        if self.active and self.emitter:
-            self.emitter.draw()
-
-    def update(self, delta_time: float = 1/60) -> None:
-        if self.active and self.emitter:
-            self.emitter.update(delta_time)
+        if self.emitter is not None:
+            self.emitter.stop()
+        self.emitter = None # PARTICLES runs it, and stops running it off screen
 
 
 class RaceEnd(arcade.Sprite):
@@ -77,10 +67,8 @@ class RaceEnd(arcade.Sprite):
         super().__init__()
         self.position = pos
         self.time = (math.pi if (self.center_y // 64) % 2 == 1 else 0)
-        texture = arcade.load_spritesheet("assets/levels/tileset.png")
         rect = arcade.rect.LBWH(576, 384, 64, 64)
-        texture = texture.get_texture(rect, y_up=True)
-        self.texture = texture
+        self.texture = TEXTURES.get_texture(TILESET, rect)
         self.race = race
         if type == "start":
             self.type = EndTypes.START
@@ -99,34 +87,34 @@ class RaceEnd(arcade.Sprite):
         self.color = (255, 255, 255, 128 + int(((math.sin(self.time) + 1) / 2) * 128))
 
 
-class TimerDisplay(arcade.Sprite):
-    def __init__(self, pos: Tuple[float, float], size: Tuple[float, float], race_id: int, level: str) -> None:
-        super().__init__()
+class TimerDisplay(arcade.SpriteSolidColor):
+    # the sprite is the black screen, the text goes into the level's batch. both are drawn by the level,
+    # all the screens in one sprite list and all the text in one batch
+    def __init__(self, pos: Tuple[float, float], size: Tuple[float, float], race_id: int, level: str, batch: Batch) -> None:
+        super().__init__(int(size[0]), int(size[1]), *pos, arcade.color.BLACK)
         self.level = level
-        self.position = pos
         self.race_id = race_id
-        self.width = size[0]
-        self.height = size[1]
         self.visual_time = 0
         self.best_time = math.inf
         self.do_blinking = False
-        self.batch = Batch()
+        self.batch = batch
         self.digits = []
-        arcade.load_font("assets/Seven Segment.ttf")
+        self.font_name = ASSETS.get("seven_segment_font")
         self.text_color = arcade.color.WHITE
+        self.digit_color = self.text_color # what the digits have right now, so they're only touched on a change
         left_bottom = (self.center_x - self.width / 2, self.center_y - self.height / 2)
         self.info_text = arcade.Text(f"",
                                            x=left_bottom[0], y=left_bottom[1] + 60,
                                            anchor_x="left", anchor_y="bottom",
                                            color=self.text_color, font_size=25,
-                                           font_name="Seven Segment", batch=self.batch)
+                                           font_name=self.font_name, batch=self.batch)
         devs = DEVS_RECORDS.get(self.level, {}).get(self.race_id, None)
         devs = f"Dev record: {self.time_string(devs)}" if devs is not None else ""
         self.devs_best = arcade.Text(f"{devs}",
                                            x=left_bottom[0], y=left_bottom[1] + 120,
                                            anchor_x="left", anchor_y="bottom",
                                            color=arcade.color.RED, font_size=25,
-                                           font_name="Seven Segment", batch=self.batch)
+                                           font_name=self.font_name, batch=self.batch)
         self.setup()
 
     def setup(self) -> None:
@@ -138,15 +126,15 @@ class TimerDisplay(arcade.Sprite):
                                            x=left_bottom[0] + step * i, y=left_bottom[1],
                                            anchor_x="left", anchor_y="bottom",
                                            color=self.text_color, font_size=40,
-                                           font_name="Seven Segment", batch=self.batch))
+                                           font_name=self.font_name, batch=self.batch))
         time = self.get_saved_race_time(self.race_id)
         self.load_best_time(time)
 
-    def set_time(self, time: float) -> None:
+    def set_time(self, time: float, replay: bytes | None = None, ghost: bytes | None = None) -> None:
         if time < self.best_time:
             self.best_time = time
             self.info_text.text = "new best!"
-            self.save_best_time()
+            self.save_best_time(replay, ghost)
             self.do_blinking = True
         else:
             self.info_text.text = f"best: {self.time_string(self.best_time)}"
@@ -155,13 +143,17 @@ class TimerDisplay(arcade.Sprite):
         for i, digit in enumerate(self.digits):
             digit.text = strin[i]
 
-    def save_best_time(self) -> None: # the raceend object should be doing this todo: change this one day
+    def save_best_time(self, replay: bytes | None = None, ghost: bytes | None = None) -> None: # the raceend object should be doing this todo: change this one day
         ok = self.get_best_times_dict()
         ok[self.race_id] = self.best_time
         ok = [f"{i};{ok[i]}\n" for i in ok.keys()]
         with open(f"assets/saved/{self.level}.txt", "w") as file:
             for line in ok:
                 file.write(line)
+        if replay is not None:
+            save_replay(self.level, self.race_id, replay)
+        if ghost is not None:
+            save_ghost(self.level, self.race_id, ghost)
 
     def get_best_times_dict(self) -> Dict[int, float]:
         try:
@@ -190,6 +182,9 @@ class TimerDisplay(arcade.Sprite):
         return f"{m}:{s}:{ms}"
 
     def update_color(self, color) -> None:
+        if color == self.digit_color:
+            return
+        self.digit_color = color
         for digit in self.digits:
             digit.color = color
 
@@ -201,10 +196,6 @@ class TimerDisplay(arcade.Sprite):
         else:
             self.update_color(arcade.color.WHITE)
 
-    def draw(self) -> None:
-        rect = arcade.rect.XYWH(*self.position, self.width, self.height)
-        arcade.draw_rect_filled(rect, arcade.color.BLACK)
-        self.batch.draw()
 
 
 class LevelEnd(arcade.Sprite):
@@ -215,23 +206,15 @@ class LevelEnd(arcade.Sprite):
         self.send_to = send_to
 
 
-class TextDisplay(arcade.Sprite):
-    def __init__(self, pos: Tuple[float, float], size: Tuple[float, float], text: str, color: Tuple[int, int, int, int] = arcade.color.WHITE, font_size: int = 20, draw_screen: bool = True) -> None:
-        super().__init__()
-        self.position = pos
-        self.width = size[0]
-        self.height = size[1]
-        self.batch = Batch()
+class TextDisplay(arcade.SpriteSolidColor):
+    def __init__(self, pos: Tuple[float, float], size: Tuple[float, float], text: str, batch: Batch, color: Tuple[int, int, int, int] = arcade.color.WHITE, font_size: int = 20, draw_screen: bool = True) -> None:
+        super().__init__(int(size[0]), int(size[1]), *pos, arcade.color.BLACK)
+        self.batch = batch
         self.draw_screen = draw_screen
+        self.visible = draw_screen # still in the screen list, just not drawn
         self.info_text = arcade.Text(f"{text}",
                                            x=self.center_x, y=self.center_y,
                                            anchor_x="center", anchor_y="center",
                                            color=color, font_size=font_size,
                                            batch=self.batch, width=int(self.width), height=int(self.height),
-                                     multiline=True)
-
-    def draw(self) -> None:
-        if self.draw_screen:
-            rect = arcade.rect.XYWH(*self.position, self.width, self.height)
-            arcade.draw_rect_filled(rect, arcade.color.BLACK)
-        self.batch.draw()
\ No newline at end of file
+                                     multiline=True)
\ No newline at end of file
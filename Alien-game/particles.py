@@ -0,0 +1,287 @@
+import arcade
+import numpy as np
+from array import array
+from PIL import Image
+from typing import Callable, Dict, List, NamedTuple, Tuple
+
+from assets import ASSETS
+from constants import PARTICLE_BUDGET, PARTICLE_MARGIN, PARTICLE_MIN_RATE, PARTICLE_SOFT_BUDGET
+
+Spread = Callable[[np.random.Generator, int], Tuple[np.ndarray, np.ndarray]] # n random (x, y) pairs
+
+RNG = np.random.default_rng()
+
+
+def in_rect(left: float, right: float, bottom: float, top: float) -> Spread:
+    return lambda rng, n: (rng.uniform(left, right, n), rng.uniform(bottom, top, n))
+
+
+def in_circle(radius: float) -> Spread: # same distribution as arcade.math.rand_in_circle
+    def spread(rng: np.random.Generator, n: int) -> Tuple[np.ndarray, np.ndarray]:
+        angle = rng.uniform(0, 2 * np.pi, n)
+        r = radius * np.sqrt(rng.random(n))
+        return r * np.cos(angle), r * np.sin(angle)
+    return spread
+
+
+class ParticlePreset(NamedTuple):
+    name: str
+    texture: str # asset name
+    velocity: Spread # change_xy, per frame at 60 fps like sprites
+    offset: Spread # start position around the emitter
+    lifetime: Tuple[float, float]
+    scale: Tuple[float, float]
+    start_alpha: Tuple[int, int] # fades to 0 over the lifetime
+    angle: Tuple[float, float] = (0, 0)
+    # what the old mutation callbacks did every frame: change_xy = (change_xy + (0, gravity)) * drag
+    gravity: float = 0
+    drag: Tuple[float, float] = (1, 1)
+    shrink: float = 1
+    spin_decay: float = 1
+    capacity: int = 256 # particles alive at once, past that new ones are dropped
+
+
+class ParticlePool:
+    # every particle of one preset in flat arrays, one vectorized update and one instanced draw per frame.
+    # slots of dead particles get reused, no objects are made or thrown away as particles come and go
+    def __init__(self, preset: ParticlePreset) -> None:
+        self.preset = preset
+        capacity = preset.capacity
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.change_x = np.zeros(capacity)
+        self.change_y = np.zeros(capacity)
+        self.scale = np.zeros(capacity)
+        self.angle = np.zeros(capacity)
+        self.age = np.zeros(capacity)
+        self.lifetime = np.ones(capacity)
+        self.start_alpha = np.zeros(capacity)
+        self.owner = np.zeros(capacity, dtype=np.int64)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.time = 0.0
+        self.next_owner = 1
+        self.count = 0
+        # gl side, made on the first draw so headless runs never need it
+        self.texture = None
+        self.buffer = None
+        self.geometry = None
+
+    def new_owner(self) -> int:
+        self.next_owner += 1
+        return self.next_owner - 1
+
+    def spawn(self, owner: int, x: float, y: float, n: int) -> float:
+        # returns how long until the last of them is gone
+        slots = np.flatnonzero(~self.alive)[:n]
+        n = len(slots)
+        if n == 0:
+            return 0.0
+        preset = self.preset
+        offset_x, offset_y = preset.offset(RNG, n)
+        change_x, change_y = preset.velocity(RNG, n)
+        self.x[slots] = x + offset_x
+        self.y[slots] = y + offset_y
+        self.change_x[slots] = change_x
+        self.change_y[slots] = change_y
+        self.scale[slots] = RNG.uniform(*preset.scale, n)
+        self.angle[slots] = RNG.uniform(*preset.angle, n)
+        self.start_alpha[slots] = RNG.integers(preset.start_alpha[0], preset.start_alpha[1], n, endpoint=True)
+        self.lifetime[slots] = RNG.uniform(*preset.lifetime, n)
+        self.age[slots] = 0
+        self.owner[slots] = owner
+        self.alive[slots] = True
+        self.count += n
+        return float(self.lifetime[slots].max())
+
+    def kill(self, owner: int) -> None:
+        self.alive[self.owner == owner] = False
+        self.count = int(np.count_nonzero(self.alive))
+
+    def clear(self) -> None:
+        self.alive[:] = False
+        self.count = 0
+
+    def update(self, delta_time: float) -> None:
+        # same order as arcade's FadeParticle: move, mutate, age. masked ufuncs leave dead slots alone without
+        # gathering the live ones into new arrays
+        self.time += delta_time
+        if self.count == 0:
+            return
+        preset = self.preset
+        alive = self.alive
+        step = delta_time * 60
+        np.add(self.x, self.change_x * step, out=self.x, where=alive)
+        np.add(self.y, self.change_y * step, out=self.y, where=alive)
+        np.multiply(self.change_x, preset.drag[0], out=self.change_x, where=alive)
+        np.add(self.change_y, preset.gravity, out=self.change_y, where=alive)
+        np.multiply(self.change_y, preset.drag[1], out=self.change_y, where=alive)
+        if preset.shrink != 1:
+            np.multiply(self.scale, preset.shrink, out=self.scale, where=alive)
+        if preset.spin_decay != 1:
+            np.multiply(self.angle, preset.spin_decay, out=self.angle, where=alive)
+        np.add(self.age, delta_time, out=self.age, where=alive)
+        alive &= self.age < self.lifetime
+        self.count = int(np.count_nonzero(self.alive))
+
+    def setup_gl(self, ctx) -> None:
+        texture = ASSETS.get(self.preset.texture)
+        image = texture.image.convert("RGBA").transpose(Image.Transpose.FLIP_TOP_BOTTOM)
+        self.texture = ctx.texture(image.size, components=4, data=image.tobytes())
+        self.size = (texture.width, texture.height)
+        self.buffer = ctx.buffer(reserve=self.preset.capacity * 5 * 4)
+        quad = ctx.buffer(data=array("f", [-0.5, 0.5, 0.0, 1.0,
+                                           -0.5, -0.5, 0.0, 0.0,
+                                           0.5, 0.5, 1.0, 1.0,
+                                           0.5, -0.5, 1.0, 0.0]))
+        self.geometry = ctx.geometry([
+            arcade.gl.BufferDescription(quad, "2f 2f", ["in_vert", "in_uv"]),
+            arcade.gl.BufferDescription(self.buffer, "2f 1f 1f 1f", ["in_position", "in_scale", "in_angle", "in_alpha"],
+                                        instanced=True),
+        ])
+
+    def draw(self) -> None:
+        if self.count == 0:
+            return
+        ctx = arcade.get_window().ctx
+        if self.geometry is None:
+            self.setup_gl(ctx)
+        alive = self.alive
+        alpha = np.clip(self.start_alpha[alive] * (1 - self.age[alive] / self.lifetime[alive]), 0, 255) / 255
+        instances = np.column_stack((self.x[alive], self.y[alive], self.scale[alive], self.angle[alive], alpha))
+        self.buffer.write(instances.astype(np.float32).tobytes())
+        program = particle_program(ctx)
+        program["texture_size"] = self.size
+        self.texture.use(0)
+        ctx.enable(ctx.BLEND)
+        ctx.blend_func = ctx.BLEND_DEFAULT
+        self.geometry.render(program, mode=ctx.TRIANGLE_STRIP, instances=len(instances))
+
+
+PROGRAMS: Dict[int, arcade.gl.Program] = {}
+
+
+def particle_program(ctx) -> arcade.gl.Program:
+    program = PROGRAMS.get(id(ctx))
+    if program is None:
+        program = ctx.program(vertex_shader=ASSETS.get("particles_vs"), fragment_shader=ASSETS.get("particles_fs"))
+        program["particle_texture"] = 0
+        PROGRAMS[id(ctx)] = program
+    return program
+
+
+class ParticleEmitter:
+    # where and how often particles of a preset come out, the particles themselves live in the preset's pool
+    def __init__(self, pool: ParticlePool, x: float, y: float, burst: int = 0, interval: float | None = None,
+                 priority: int = 0) -> None:
+        self.pool = pool
+        self.owner = pool.new_owner()
+        self.center_x = x
+        self.center_y = y
+        self.burst = burst
+        self.interval = interval
+        self.priority = priority # feedback for what the player just did goes above scenery
+        self.carryover = 0.0
+        self.gone_at = pool.time # when the last particle it made dies
+
+    def update(self, delta_time: float = 1/60, rate: float = 1.0) -> None:
+        # rate is what the budget and distance leave of the full emission rate, it scales bursts and intervals alike
+        count = int(self.burst * rate + RNG.random()) if self.burst else 0 # a burst off screen just doesn't happen
+        self.burst = 0
+        if self.interval is not None:
+            if rate <= 0:
+                self.carryover = 0 # suspended, coming back on screen shouldn't spit out everything it missed
+            else:
+                self.carryover += delta_time * rate
+                emitted = int(self.carryover // self.interval)
+                self.carryover -= emitted * self.interval
+                count += emitted
+        if count:
+            life = self.pool.spawn(self.owner, self.center_x, self.center_y, count)
+            self.gone_at = max(self.gone_at, self.pool.time + life)
+
+    def can_reap(self) -> bool:
+        return self.burst == 0 and self.interval is None and self.pool.time >= self.gone_at
+
+    def stop(self) -> None: # its particles vanish with it
+        self.interval = None
+        self.burst = 0
+        self.pool.kill(self.owner)
+        self.gone_at = self.pool.time
+
+
+class ParticleSystem:
+    # every emitter in the game goes through here. emitters near the camera run at full rate, further out they
+    # thin out and off screen they stop. once the live particles get close to the budget the low priority
+    # ones back off first, at the budget nothing new comes out at all
+    def __init__(self, budget: int, margin: float, min_rate: float, soft_budget: float) -> None:
+        self.budget = budget
+        self.margin = margin # how far off screen an emitter keeps going
+        self.min_rate = min_rate # the rate at the edge of the margin
+        self.soft_budget = soft_budget # fraction of the budget where low priority emitters start backing off
+        self.pools: Dict[str, ParticlePool] = {}
+        self.emitters: List[ParticleEmitter] = []
+        self.suspended = 0
+
+    def pool(self, preset: ParticlePreset) -> ParticlePool:
+        pool = self.pools.get(preset.name)
+        if pool is None:
+            pool = ParticlePool(preset)
+            self.pools[preset.name] = pool
+        return pool
+
+    def emitter(self, preset: ParticlePreset, x: float, y: float, burst: int = 0,
+                interval: float | None = None, priority: int = 0) -> ParticleEmitter:
+        emitter = ParticleEmitter(self.pool(preset), x, y, burst, interval, priority)
+        self.emitters.append(emitter)
+        return emitter
+
+    def budget_rate(self, priority: int) -> float:
+        count = self.count
+        if count >= self.budget:
+            return 0.0
+        if priority > 0:
+            return 1.0
+        soft = self.budget * self.soft_budget
+        return min(max((self.budget - count) / (self.budget - soft), 0.0), 1.0)
+
+    def distance_rate(self, emitter: ParticleEmitter, position: Tuple[float, float], size: Tuple[float, float]) -> float:
+        # 1 anywhere on screen, then down to min_rate at the edge of the margin, 0 past it
+        outside = max(abs(emitter.center_x - position[0]) - size[0] / 2,
+                      abs(emitter.center_y - position[1]) - size[1] / 2, 0.0)
+        if outside > self.margin:
+            return 0.0
+        return 1.0 - (1.0 - self.min_rate) * outside / self.margin
+
+    def update(self, delta_time: float, position: Tuple[float, float], size: Tuple[float, float]) -> None:
+        self.suspended = 0
+        for emitter in self.emitters:
+            rate = self.distance_rate(emitter, position, size)
+            if rate > 0:
+                rate *= self.budget_rate(emitter.priority)
+            else:
+                self.suspended += 1
+            emitter.update(delta_time, rate)
+        for pool in self.pools.values():
+            pool.update(delta_time)
+        self.emitters = [emitter for emitter in self.emitters if not emitter.can_reap()] # never removed mid loop
+
+    def draw(self, *presets: ParticlePreset) -> None:
+        for preset in presets:
+            pool = self.pools.get(preset.name)
+            if pool is not None:
+                pool.draw()
+
+    def clear(self) -> None:
+        for pool in self.pools.values():
+            pool.clear()
+        self.emitters = []
+
+    @property
+    def count(self) -> int:
+        return sum(pool.count for pool in self.pools.values())
+
+    def report(self) -> str:
+        return f"particles: {self.count}/{self.budget} emitters: {len(self.emitters)} ({self.suspended} suspended)"
+
+
+PARTICLES = ParticleSystem(PARTICLE_BUDGET, PARTICLE_MARGIN, PARTICLE_MIN_RATE, PARTICLE_SOFT_BUDGET)
@@ -0,0 +1,90 @@
+import math
+import arcade
+import numpy as np
+import pymunk
+from typing import List, Tuple
+
+BOUND_SLACK = 1e-6 # float noise in a position shouldn't decide whether a platform turns around on this tick or the next
+
+
+class PlatformController:
+    # every moving platform of a level in a few arrays, one pass per tick instead of a python loop over sprites.
+    # kinematic bodies move by exactly velocity * dt, so positions are tracked here instead of read back from pymunk
+    def __init__(self, physics_engine: arcade.PymunkPhysicsEngine, platforms: arcade.SpriteList, speed_scale: float) -> None:
+        self.bodies: List[pymunk.Body] = [physics_engine.get_physics_object(platform).body for platform in platforms]
+        count = len(self.bodies)
+        self.speed_scale = speed_scale
+        self.positions = np.array([body.position for body in self.bodies], dtype=np.float64).reshape(count, 2)
+        self.change = np.array([(p.change_x, p.change_y) for p in platforms], dtype=np.float64).reshape(count, 2)
+        self.velocity = np.zeros((count, 2)) # what the bodies have right now, nothing until the first update
+        self.low = np.array([(p.boundary_left, p.boundary_bottom) for p in platforms], dtype=np.float64).reshape(count, 2)
+        self.high = np.array([(p.boundary_right, p.boundary_top) for p in platforms], dtype=np.float64).reshape(count, 2)
+        # edges relative to the center, same as sprite.left/bottom and sprite.right/top
+        self.low_edge = np.array([(p.left - p.center_x, p.bottom - p.center_y) for p in platforms],
+                                 dtype=np.float64).reshape(count, 2)
+        self.high_edge = np.array([(p.right - p.center_x, p.top - p.center_y) for p in platforms],
+                                  dtype=np.float64).reshape(count, 2)
+        # platforms far from the camera stand still and get moved to where they should be when they wake up
+        self.time = 0.0
+        self.awake = np.zeros(count, dtype=bool)
+        self.slept_at = np.zeros(count)
+
+    def update(self, delta_time: float) -> None: # call right after the physics step
+        if not self.bodies:
+            return
+        self.time += delta_time
+        self.positions += self.velocity * delta_time
+        bounce = ((self.change > 0) & (self.positions + self.high_edge >= self.high - BOUND_SLACK)) | \
+                 ((self.change < 0) & (self.positions + self.low_edge <= self.low + BOUND_SLACK))
+        self.change[bounce & self.awake[:, None]] *= -1
+        self.write_velocities()
+
+    def write_velocities(self) -> None:
+        velocity = self.change * self.speed_scale * self.awake[:, None]
+        changed = np.flatnonzero((velocity != self.velocity).any(axis=1))
+        self.velocity = velocity
+        for i in changed.tolist(): # pymunk has no bulk setter, but velocities only change on a bounce or wake up
+            self.bodies[i].velocity = tuple(velocity[i].tolist())
+
+    def wake_near(self, position: Tuple[float, float], radius: float, delta_time: float) -> None: # call before the physics step
+        if not self.bodies:
+            return
+        awake = (np.abs(self.positions - position) <= radius).all(axis=1)
+        self.slept_at[self.awake & ~awake] = self.time
+        waking = np.flatnonzero(awake & ~self.awake)
+        self.awake = awake
+        if len(waking):
+            self.advance(waking, self.time - self.slept_at[waking], delta_time)
+            for i in waking.tolist():
+                self.bodies[i].position = tuple(self.positions[i].tolist())
+        self.write_velocities()
+
+    def advance(self, index: np.ndarray, elapsed: np.ndarray, delta_time: float) -> None:
+        # plays the ticks a platform slept through without stepping them one by one. update() only turns around
+        # after a move that ends past a bound, so a turning point is the first point on the platform's step grid
+        # past the bound, at least one step away. jump from turning point to turning point, once it has gone
+        # from one to another and back the legs repeat, and whole round trips can be skipped
+        for i, ticks in zip(index.tolist(), np.rint(elapsed / delta_time).astype(int).tolist()):
+            for axis in range(2):
+                change = self.change[i, axis]
+                if change == 0:
+                    continue
+                step = abs(change) * self.speed_scale * delta_time
+                lo = self.low[i, axis] - self.low_edge[i, axis] + BOUND_SLACK
+                hi = self.high[i, axis] - self.high_edge[i, axis] - BOUND_SLACK
+                position = self.positions[i, axis]
+                forward = change > 0
+                legs: List[int] = []
+                while ticks > 0:
+                    steps = max(1, math.ceil(((hi - position) if forward else (position - lo)) / step))
+                    if ticks < steps:
+                        position += ticks * step if forward else -ticks * step
+                        break
+                    position += steps * step if forward else -steps * step
+                    ticks -= steps
+                    forward = not forward
+                    legs.append(steps)
+                    if len(legs) == 3: # turning points 1 and 2 bounce between each other from now on
+                        ticks %= legs[1] + legs[2]
+                self.positions[i, axis] = position
+                self.change[i, axis] = abs(change) if forward else -abs(change)
@@ -1,56 +1,77 @@
 import arcade
-import random
-from arcade.particles import (FadeParticle, Emitter, EmitBurst)
-from typing import Tuple, List
-from util import read_settings
+from typing import Tuple, List, Dict
+from sound_bank import SOUNDS
+from textures import TEXTURES
+from particles import PARTICLES, ParticleEmitter, ParticlePreset, in_circle, in_rect
 
 from constants import *
 
 
-def tp_mutator(p):
-    p.change_y -= 0.03
-    p.change_x *= 1.05
-    p.change_y *= 1.05
-    p.width *= 0.93
-    p.height *= 0.93
-    p.angle *= 0.99
-
-
-def jump_mutator(p):
-    p.change_y -= 0.03
-    p.change_x *= 0.96
-    p.change_y *= 0.8
-    p.width *= 0.93
-    p.height *= 0.93
-
-
-def make_jump_particles(x, y):
-    return Emitter(center_xy=(x, y),
-        emit_controller=EmitBurst(12),
-        particle_factory=lambda e: FadeParticle(
-            filename_or_texture=JUMP_PARTICLE,
-            change_xy=(random.uniform(-1, 1), random.uniform(0, 2)),
-            center_xy=arcade.math.rand_on_line((-10, 0), (10, 0)),
-            lifetime=random.uniform(1.0, 1.1),
-            scale=random.uniform(0.3, 1.1),
-            start_alpha=255, end_alpha=0,
-            mutation_callback=jump_mutator,
-        ),)
-
-
-def make_tp_particles(x, y):
-    return Emitter(center_xy=(x, y),
-        emit_controller=EmitBurst(20),
-        particle_factory=lambda e: FadeParticle(
-            filename_or_texture=TP_PARTICLE,
-            change_xy=arcade.math.rand_in_circle((0, 0), 2),
-            center_xy=arcade.math.rand_in_circle((0, 0), 32),
-            lifetime=random.uniform(1.0, 1.1),
-            scale=random.uniform(0.3, 0.5),
-            start_alpha=random.randint(200, 255), end_alpha=0,
-            angle=random.uniform(-360, 360),
-            mutation_callback=tp_mutator,
-        ),)
+PLAYER_ANIMATIONS = {
+    "idle": [f"./assets/player/idle/idle_{i}.png" for i in range(2)],
+    "walk": [f"./assets/player/walk/walk_{i}.png" for i in range(6)],
+}
+PLAYER_ANIMATIONS["teleporting"] = PLAYER_ANIMATIONS["idle"]
+
+AnimationSet = Dict[Direction, Dict[str, Tuple[arcade.Texture, ...]]]
+ANIMATION_SETS: Dict[str, AnimationSet] = {}
+
+
+def get_animation_set(name: str, states: Dict[str, List[str]]) -> AnimationSet:
+    # loaded once per process, mirrored frames are made here so nothing gets flipped while playing
+    animation_set = ANIMATION_SETS.get(name)
+    if animation_set is not None:
+        return animation_set
+    flipped: Dict[arcade.Texture, arcade.Texture] = {}
+    right = {}
+    left = {}
+    for state, paths in states.items():
+        frames = tuple(TEXTURES.load_texture(path) for path in paths)
+        for texture in frames:
+            if texture not in flipped:
+                flipped[texture] = texture.flip_horizontally()
+        right[state] = frames
+        left[state] = tuple(flipped[texture] for texture in frames)
+    animation_set = {Direction.RIGHT: right, Direction.LEFT: left}
+    ANIMATION_SETS[name] = animation_set
+    return animation_set
+
+
+TP_PARTICLES = ParticlePreset(
+    name="tp",
+    texture="tp_particle",
+    velocity=in_circle(2),
+    offset=in_circle(32),
+    lifetime=(1.0, 1.1),
+    scale=(0.3, 0.5),
+    start_alpha=(200, 255),
+    angle=(-360, 360),
+    gravity=-0.03,
+    drag=(1.05, 1.05),
+    shrink=0.93,
+    spin_decay=0.99,
+)
+
+JUMP_PARTICLES = ParticlePreset(
+    name="jump",
+    texture="jump_particle",
+    velocity=in_rect(-1, 1, 0, 2),
+    offset=in_rect(-10, 10, 0, 0),
+    lifetime=(1.0, 1.1),
+    scale=(0.3, 1.1),
+    start_alpha=(255, 255),
+    gravity=-0.03,
+    drag=(0.96, 0.8),
+    shrink=0.93,
+)
+
+
+def make_jump_particles(x, y) -> ParticleEmitter:
+    return PARTICLES.emitter(JUMP_PARTICLES, x, y, burst=12, priority=1)
+
+
+def make_tp_particles(x, y) -> ParticleEmitter:
+    return PARTICLES.emitter(TP_PARTICLES, x, y, burst=20, priority=1)
 
 
 class Player(arcade.Sprite):
@@ -58,16 +79,9 @@ class Player(arcade.Sprite):
         super().__init__()
         self.view = view
 
-        self.idle_textures = [arcade.load_texture(f"./assets/player/idle/idle_{i}.png")
-                              for i in range(2)]
-        self.walk_textures = [arcade.load_texture(f"./assets/player/walk/walk_{i}.png")
-                              for i in range(6)]
+        self.animations = get_animation_set("player", PLAYER_ANIMATIONS)
 
-        self.animation_states: dict[str, list[arcade.Texture]] = {"idle": self.idle_textures,
-                                 "walk": self.walk_textures,
-                                 "teleporting": self.idle_textures}
-
-        self.texture = self.idle_textures[0]
+        self.texture = self.animations[Direction.RIGHT]["idle"][0]
         self.scale = PLAYER_SCALE
         self.speed = PLAYER_SPEED
         self.animation_frame = 0
@@ -76,7 +90,6 @@ class Player(arcade.Sprite):
 
         self.animation_state: str = "idle"
         self.direction: Direction = Direction.RIGHT
-        self.emitters: List[Emitter] = []
 
         self.coyote_time = 0 # time since last on ground
 
@@ -95,11 +108,10 @@ class Player(arcade.Sprite):
                 dx += self.speed
         if y >= 90:
             if self.coyote_time <= COYOTE_TIME:
-                sound = arcade.Sound("assets/sounds/jump.wav")
-                sound.play(loop=False, volume=0.5 * read_settings().get("volume", 100) / 100)
+                SOUNDS.play("jump", 0.5)
                 self.coyote_time = 999
                 impulse = (0, PLAYER_JUMP_IMPULSE)
-                self.emitters.append(make_jump_particles(self.center_x, self.bottom + 3))
+                make_jump_particles(self.center_x, self.bottom + 3)
                 self.view.physics_engine.apply_impulse(self, impulse)
 
         return (dx, dy)
@@ -111,11 +123,6 @@ class Player(arcade.Sprite):
         else:
             self.coyote_time += delta_time
 
-        for emitter in self.emitters:
-            emitter.update(delta_time)
-            if emitter.can_reap():
-                self.emitters.remove(emitter)
-
         if arcade.key.R in keys_pressed:
             self.view.physics_engine.set_friction(self, 1.0)
             self.tp_timer += delta_time
@@ -148,29 +155,25 @@ class Player(arcade.Sprite):
         self.animation_timer += delta_time
         if self.animation_timer >= 1 / ANIMATION_FPS:
             self.animation_timer = 0
-            anim_lenght = len(self.animation_states[self.animation_state])
+            frames = self.animations[self.direction][self.animation_state]
             self.animation_frame += 1
-            if self.animation_frame >= anim_lenght:
+            if self.animation_frame >= len(frames):
                 self.animation_frame = 0
-            if self.direction == Direction.RIGHT:
-                self.texture = self.animation_states[self.animation_state][self.animation_frame]
-            else:
-                self.texture = self.animation_states[self.animation_state][self.animation_frame].flip_horizontally()
+            self.texture = frames[self.animation_frame]
 
     def respawn_at_chkpnt(self) -> None:
         checkpoint = self.view.get_cur_checkpoint()
         if checkpoint is None:
             return
-        if checkpoint.reset_timer:
-            self.view.cur_race_timer = 0
-            self.view.timer_bleep = 0
-        sound = arcade.Sound("assets/sounds/teleport.wav")
-        sound.play(loop=False, volume=0.5 * read_settings().get("volume", 100) / 100)
+        SOUNDS.play("teleport", 0.5)
         x, y = checkpoint.position
         y += 10
-        self.emitters.append(make_tp_particles(*self.position))
+        make_tp_particles(*self.position)
         self.view.physics_engine.set_position(self, (x, y))
         self.view.physics_engine.set_velocity(self, (0, 0))
+        if checkpoint.reset_timer:
+            self.position = (x, y) # the sprite would only catch up with the body next step, the ghost starts from here
+            self.view.restart_race()
 
     def draw(self) -> None:
         if self.tp_timer > 0:
@@ -182,5 +185,4 @@ class Player(arcade.Sprite):
                                     start_angle=0,
                                     end_angle=angle,
                                     border_width=7,)
-        for emitter in self.emitters:
-            emitter.draw()
\ No newline at end of file
+        PARTICLES.draw(JUMP_PARTICLES, TP_PARTICLES) # every jump and teleport at once
\ No newline at end of file
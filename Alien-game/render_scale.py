@@ -0,0 +1,106 @@
+import time
+from arcade.experimental import Shadertoy
+from arcade.gl import geometry
+from typing import Tuple
+
+from settings import SETTINGS
+
+RENDER_SCALES = (0.5, 0.625, 0.75, 0.875, 1.0) # what auto picks from
+FRAME_BUDGET = 1 / 60 # the window draws at 60, frames that take longer than this are dropped ones
+SMOOTHING = 0.1
+SLOW_FRAMES = 1.15 # over the budget by this much on average and the scale goes down
+STEP_DOWN_WAIT = 1.0 # seconds between steps down, the average needs a moment to catch up
+PROBE_WAIT = 5.0 # seconds of keeping up before trying one step up again
+
+
+def scaled_size(size: Tuple[int, int], scale: float) -> Tuple[int, int]:
+    return (max(1, round(size[0] * scale)), max(1, round(size[1] * scale)))
+
+
+class ResolutionScaler:
+    # how big the fill-rate heavy passes (stars, lights) render, sprites and ui always stay at native size.
+    # frames never come in faster than the draw rate, so there is no way to see headroom directly: every
+    # so often it tries a step up, and waits twice as long before the next try if that made frames slow
+    def __init__(self, budget: float = FRAME_BUDGET) -> None:
+        self.budget = budget
+        self.index = len(RENDER_SCALES) - 1
+        self.frame_time = budget
+        self.last_frame: float | None = None
+        self.wait = 0.0
+        self.probe_wait = PROBE_WAIT
+        self.probed = False # the last change was a step up that hasn't proven itself yet
+
+    @property
+    def auto(self) -> bool:
+        return SETTINGS.get("auto_render_scale", True)
+
+    @property
+    def scale(self) -> float:
+        if self.auto:
+            return RENDER_SCALES[self.index]
+        return SETTINGS.get("render_scale", 100) / 100
+
+    def frame(self) -> None: # once per drawn frame
+        now = time.perf_counter()
+        delta_time = now - self.last_frame if self.last_frame is not None else self.budget
+        self.last_frame = now
+        if delta_time > 0.25: # loading or the window was dragged, not the gpu's fault
+            return
+        self.frame_time += (delta_time - self.frame_time) * SMOOTHING
+        if not self.auto:
+            return
+        self.wait -= delta_time
+        if self.wait > 0:
+            return
+        if self.frame_time > self.budget * SLOW_FRAMES and self.index > 0:
+            if self.probed:
+                self.probe_wait *= 2 # that step up was one too many
+            self.index -= 1
+            self.probed = False
+            self.wait = STEP_DOWN_WAIT
+        elif self.frame_time <= self.budget * SLOW_FRAMES:
+            if self.probed:
+                self.probe_wait = PROBE_WAIT # kept up at the higher scale
+                self.probed = False
+            if self.index < len(RENDER_SCALES) - 1 and self.wait <= -self.probe_wait:
+                self.index += 1
+                self.probed = True
+                self.wait = STEP_DOWN_WAIT
+
+    def report(self) -> str:
+        mode = "auto" if self.auto else "fixed"
+        return f"render scale: {self.scale:.0%} ({mode}) frame: {self.frame_time * 1000:.1f} ms"
+
+
+RENDER_SCALE = ResolutionScaler()
+
+
+class ScaledShadertoy:
+    # a Shadertoy rendered offscreen at the current render scale and stretched over whatever is being drawn to
+    def __init__(self, size: Tuple[int, int], source: str) -> None:
+        self.size = size
+        self.shadertoy = Shadertoy(size, source)
+        self.ctx = self.shadertoy.ctx
+        self.fbo = None
+        self.quad = geometry.quad_2d_fs()
+
+    def resize(self, size: Tuple[int, int]) -> None:
+        self.size = size
+        self.fbo = None
+
+    def render(self, time: float = 0) -> None:
+        scale = RENDER_SCALE.scale
+        if scale >= 1:
+            self.render_shadertoy(time, self.size)
+            return
+        size = scaled_size(self.size, scale)
+        if self.fbo is None or self.fbo.size != size:
+            self.fbo = self.ctx.framebuffer(color_attachments=[self.ctx.texture(size, components=4)])
+        with self.fbo.activate():
+            self.render_shadertoy(time, size)
+        self.fbo.color_attachments[0].use(0)
+        self.ctx.utility_textured_quad_program["texture0"] = 0
+        self.quad.render(self.ctx.utility_textured_quad_program)
+
+    def render_shadertoy(self, time: float, size: Tuple[int, int]) -> None: # into whatever is active, at size
+        self.shadertoy.render(time=time, size=size)
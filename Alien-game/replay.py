@@ -0,0 +1,155 @@
+import struct
+import hashlib
+import arcade
+from typing import Iterator, NamedTuple, Set, Tuple
+
+MAGIC = b"ARPL"
+VERSION = 1
+TRACKED_KEYS = (arcade.key.R,) # the only keys Player.update looks at, right click ends up as R too
+# bump this whenever something changes what a tick does (physics, player logic, level loading, constants),
+# a replay from a different simulation won't play back the same. a constant, built games have no sources to hash
+SIMULATION_VERSION = "1"
+BUILD_HASH = hashlib.sha1(SIMULATION_VERSION.encode()).digest()[:8] # same 8 bytes in the header as before
+
+TickInput = Tuple[Tuple[int, int], Set[int]]
+
+
+def replay_path(level: str, race_id: int) -> str:
+    return f"assets/saved/{level}_{race_id}.replay"
+
+
+def write_varint(out: bytearray, value: int) -> None:
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    value = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def zigzag(value: int) -> int: # small negative numbers become small positive ones
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+
+def unzigzag(value: int) -> int:
+    return value // 2 if value % 2 == 0 else -(value + 1) // 2
+
+
+def keys_to_mask(keys: Set[int]) -> int:
+    mask = 0
+    for bit, key in enumerate(TRACKED_KEYS):
+        if key in keys:
+            mask |= 1 << bit
+    return mask
+
+
+def mask_to_keys(mask: int) -> Set[int]:
+    return {key for bit, key in enumerate(TRACKED_KEYS) if mask & (1 << bit)}
+
+
+class ReplayHeader(NamedTuple):
+    level: str
+    race_id: int
+    tick_rate: int
+    build_hash: bytes
+    camera: Tuple[float, float] # where the camera started, it decides which platforms are awake
+    start_tick: int # the race itself, the ticks before it are the way to the start line
+    end_tick: int
+    race_time: float
+
+
+class InputRecorder:
+    # every tick's input from the moment the level was set up, as runs of (repeat count and keys, delta x, delta y).
+    # ticks instead of frames, so playback doesn't depend on frame timing at all
+    def __init__(self, level: str, tick_rate: int, camera: Tuple[float, float]) -> None:
+        self.level = level
+        self.tick_rate = tick_rate
+        self.camera = camera
+        self.stream = bytearray()
+        self.ticks = 0
+        self.last = (0, 0, 0) # x, y, keys of the last written run
+        self.current: Tuple[int, int, int] | None = None
+        self.run = 0
+
+    def record(self, mouse: Tuple[int, int], keys: Set[int]) -> None:
+        entry = (mouse[0], mouse[1], keys_to_mask(keys))
+        if entry != self.current:
+            if self.run:
+                self.write_run(self.stream)
+                self.last = self.current
+            self.current = entry
+            self.run = 0
+        self.run += 1
+        self.ticks += 1
+
+    def write_run(self, out: bytearray) -> None:
+        x, y, keys = self.current
+        write_varint(out, self.run << len(TRACKED_KEYS) | keys) # a run of 1-31 ticks with R fits one byte
+        write_varint(out, zigzag(x - self.last[0]))
+        write_varint(out, zigzag(y - self.last[1]))
+
+    def to_bytes(self, race_id: int, start_tick: int, race_time: float) -> bytes:
+        out = bytearray(MAGIC)
+        write_varint(out, VERSION)
+        level = self.level.encode("utf-8")
+        write_varint(out, len(level))
+        out += level
+        write_varint(out, zigzag(race_id))
+        write_varint(out, self.tick_rate)
+        out += BUILD_HASH
+        out += struct.pack("<ddd", self.camera[0], self.camera[1], race_time)
+        write_varint(out, start_tick)
+        write_varint(out, self.ticks)
+        out += self.stream
+        if self.run:
+            self.write_run(out) # the run still in progress, it stays open in self.stream
+        return bytes(out)
+
+
+def read_replay(data: bytes) -> Tuple[ReplayHeader, Iterator[TickInput]]:
+    if data[:4] != MAGIC:
+        raise ValueError("not a replay")
+    version, pos = read_varint(data, 4)
+    if version != VERSION:
+        raise ValueError(f"unsupported replay version {version}")
+    length, pos = read_varint(data, pos)
+    level = data[pos:pos + length].decode("utf-8")
+    pos += length
+    race_id, pos = read_varint(data, pos)
+    tick_rate, pos = read_varint(data, pos)
+    build_hash = data[pos:pos + 8]
+    camera_x, camera_y, race_time = struct.unpack_from("<ddd", data, pos + 8)
+    pos += 8 + 24
+    start_tick, pos = read_varint(data, pos)
+    end_tick, pos = read_varint(data, pos)
+    header = ReplayHeader(level, unzigzag(race_id), tick_rate, build_hash, (camera_x, camera_y),
+                          start_tick, end_tick, race_time)
+    return header, iter_inputs(data, pos)
+
+
+def iter_inputs(data: bytes, pos: int) -> Iterator[TickInput]:
+    x = y = 0
+    while pos < len(data):
+        run, pos = read_varint(data, pos)
+        dx, pos = read_varint(data, pos)
+        dy, pos = read_varint(data, pos)
+        x += unzigzag(dx)
+        y += unzigzag(dy)
+        keys = mask_to_keys(run & ((1 << len(TRACKED_KEYS)) - 1))
+        for _ in range(run >> len(TRACKED_KEYS)):
+            yield (x, y), set(keys)
+
+
+def save_replay(level: str, race_id: int, data: bytes) -> None:
+    with open(replay_path(level, race_id), "wb") as file:
+        file.write(data)
@@ -0,0 +1,172 @@
+import os
+import math
+import time
+import atexit
+import tempfile
+import threading
+from typing import Any, Callable, Dict, List
+
+
+SETTINGS_PATH = "assets/settings.txt"
+CHECK_INTERVAL = 1.0 # seconds between mtime checks, so get() is a dict lookup most of the time
+WRITE_DELAY = 0.5 # changes made within this window are written to disk once
+
+
+class SettingsStore:
+    def __init__(self, path: str = SETTINGS_PATH, check_interval: float = CHECK_INTERVAL,
+                 write_delay: float = WRITE_DELAY) -> None:
+        self.path = path
+        self.check_interval = check_interval
+        self.write_delay = write_delay
+        self.values: Dict[str, Any] = {}
+        self.listeners: List[Callable[[str, Any], None]] = []
+        self.loaded = False
+        self.mtime: int | None = None
+        self.last_check = -math.inf
+
+        # write-behind state, the writer thread only ever sees snapshots of self.values
+        self.condition = threading.Condition()
+        self.write_lock = threading.Lock()
+        self.dirty = False
+        self.writing = False
+        self.deadline = 0.0
+        self.writer: threading.Thread | None = None
+
+    def get(self, key: str, default: Any = None) -> Any:
+        self.refresh()
+        return self.values.get(key, default)
+
+    def as_dict(self) -> Dict[str, Any]:
+        self.refresh()
+        return dict(self.values)
+
+    def update(self, **changes: Any) -> None:
+        self.refresh()
+        changed = {}
+        with self.condition:
+            for key, value in changes.items():
+                if value is None or self.values.get(key) == value:
+                    continue
+                self.values[key] = value
+                changed[key] = value
+            if not changed:
+                return
+            self.schedule_write()
+        for key, value in changed.items():
+            self.notify(key, value)
+
+    def add_listener(self, callback: Callable[[str, Any], None]) -> None:
+        if callback not in self.listeners:
+            self.listeners.append(callback)
+
+    def remove_listener(self, callback: Callable[[str, Any], None]) -> None:
+        if callback in self.listeners:
+            self.listeners.remove(callback)
+
+    def notify(self, key: str, value: Any) -> None:
+        for callback in list(self.listeners):
+            callback(key, value)
+
+    def refresh(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if self.loaded and not force and now - self.last_check < self.check_interval:
+            return
+        self.last_check = now
+        with self.condition:
+            if self.dirty or self.writing: # the file is about to be overwritten with what we have anyway
+                return
+        mtime = self.stat_mtime()
+        if self.loaded and mtime == self.mtime:
+            return
+        old = self.values
+        self.values = self.read()
+        self.mtime = mtime
+        if not self.loaded:
+            self.loaded = True
+            return
+        for key, value in self.values.items():
+            if old.get(key) != value:
+                self.notify(key, value)
+
+    def stat_mtime(self) -> int | None:
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def read(self) -> Dict[str, Any]:
+        res = {}
+        try:
+            with open(self.path, "r") as file:
+                lines = [i.rstrip("\n").split(";") for i in file.readlines()]
+                for line in lines:
+                    if line[0] == "volume":
+                        res["volume"] = int(line[1])
+                    elif line[0] == "fullscreen":
+                        res["fullscreen"] = bool(int(line[1]))
+                    elif line[0] == "physics_rate":
+                        res["physics_rate"] = int(line[1])
+                    elif line[0] == "baked_lights":
+                        res["baked_lights"] = bool(int(line[1]))
+                    elif line[0] == "render_scale":
+                        res["render_scale"] = int(line[1])
+                    elif line[0] == "auto_render_scale":
+                        res["auto_render_scale"] = bool(int(line[1]))
+        except FileNotFoundError:
+            pass
+        return res
+
+    def schedule_write(self) -> None: # must be called with self.condition held
+        self.dirty = True
+        self.deadline = time.monotonic() + self.write_delay
+        if self.writer is None or not self.writer.is_alive():
+            self.writer = threading.Thread(target=self.write_loop, name="settings-writer", daemon=True)
+            self.writer.start()
+        self.condition.notify()
+
+    def write_loop(self) -> None:
+        while True:
+            with self.condition:
+                while not self.dirty:
+                    self.condition.wait()
+                remaining = self.deadline - time.monotonic()
+                if remaining > 0: # keep coalescing until changes stop coming in
+                    self.condition.wait(remaining)
+                    continue
+            self.flush()
+
+    def flush(self) -> None:
+        with self.write_lock:
+            with self.condition:
+                if not self.dirty:
+                    return
+                snapshot = dict(self.values)
+                self.dirty = False
+                self.writing = True
+            try:
+                self.write(snapshot)
+            finally:
+                with self.condition:
+                    self.mtime = self.stat_mtime()
+                    self.writing = False
+
+    def write(self, values: Dict[str, Any]) -> None:
+        lines = [f"{i};{int(values[i])}\n" for i in values.keys()]
+        directory = os.path.dirname(self.path) or "."
+        fd, tmp_path = tempfile.mkstemp(prefix=".settings", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "w") as file:
+                file.writelines(lines)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp_path, self.path) # atomic, a crash leaves either the old or the new file
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+
+SETTINGS = SettingsStore()
+atexit.register(SETTINGS.flush)
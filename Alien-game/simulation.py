@@ -0,0 +1,168 @@
+import math
+import time
+import random
+import argparse
+import pyglet
+pyglet.options.headless = True # importing arcade still wants a GL context, EGL gives one without a display
+import arcade
+import numpy as np
+from typing import FrozenSet, Iterable, Iterator, List, NamedTuple, Tuple
+
+from sound_bank import SOUNDS
+from main import GameView
+from replay import BUILD_HASH, read_replay
+
+
+class InputFrame(NamedTuple):
+    mouse: Tuple[float, float] # screen coordinates, same as on_mouse_motion
+    keys: FrozenSet[int] = frozenset()
+
+
+class SimulationResult(NamedTuple):
+    level: str | None # where the player ended up, None if they went back to the menu
+    frames: int
+    seconds: float
+    position: Tuple[float, float]
+    races: List[Tuple[str, int, float]]
+
+    @property
+    def fps(self) -> float:
+        return self.frames / self.seconds if self.seconds > 0 else float("inf")
+
+    def report(self) -> str:
+        races = ", ".join(f"{level} #{race_id} {race_time:.3f}s" for level, race_id, race_time in self.races) or "none"
+        return (f"{self.frames} frames in {self.seconds:.2f} s ({self.fps:.0f} simulated fps)\n"
+                f"level: {self.level} position: ({self.position[0]:.3f}, {self.position[1]:.3f})\n"
+                f"races: {races}")
+
+
+class VerifyResult(NamedTuple):
+    ok: bool
+    build_matches: bool
+    expected: float
+    replayed: float | None
+    ticks: int
+    tick_rate: int
+    seconds: float
+
+    def report(self) -> str:
+        speed = self.ticks / self.tick_rate / self.seconds if self.seconds > 0 else float("inf")
+        build = "" if self.build_matches else " (recorded with a different build)"
+        return (f"{'ok' if self.ok else 'MISMATCH'}{build}: expected {self.expected!r}, got {self.replayed!r}\n"
+                f"{self.ticks} ticks in {self.seconds:.2f} s ({speed:.0f}x real time)")
+
+
+class PlatformCheckResult(NamedTuple):
+    ok: bool
+    level: str
+    sleep: Tuple[int, int]
+    errors: List[float] # per platform, how far the woken one is from the one that never slept
+    steps: List[float] # per platform, how far it moves in one tick
+
+    def report(self) -> str:
+        return (f"{'ok' if self.ok else 'MISMATCH'}: {self.level} asleep for ticks {self.sleep[0]}-{self.sleep[1]}, "
+                f"worst error {max(self.errors, default=0.0):.3f} px")
+
+
+def check_platform_sleep(level: str, sleep: Tuple[int, int], ticks: int = 3000) -> PlatformCheckResult:
+    # steps every platform of a level twice, once always awake and once asleep for a while, they have to
+    # end up within a step of each other
+    runs = []
+    for asleep in (False, True):
+        view = GameView(headless=True)
+        view.setup(level)
+        controller = view.platform_controller
+        for tick in range(ticks):
+            far = asleep and sleep[0] <= tick < sleep[1]
+            controller.wake_near((0, 0), -1 if far else math.inf, view.tick) # a negative radius wakes nothing
+            view.physics_engine.step(view.tick)
+            controller.update(view.tick)
+        runs.append(controller)
+    awake, woken = runs
+    errors = np.abs(awake.positions - woken.positions).max(axis=1).tolist() if awake.bodies else []
+    steps = (np.abs(awake.change).max(axis=1) * awake.speed_scale * view.tick).tolist() if awake.bodies else []
+    ok = all(error <= step + 1e-6 for error, step in zip(errors, steps))
+    return PlatformCheckResult(ok, level, sleep, errors, steps)
+
+
+def load_script(path: str) -> Iterator[InputFrame]:
+    # one line per stretch of input: "<frames> <mouse x> <mouse y> [KEY,KEY...]", # starts a comment
+    with open(path, "r") as file:
+        for line in file:
+            line = line.split("#")[0].split()
+            if not line:
+                continue
+            keys = frozenset(getattr(arcade.key, name.upper()) for name in line[3].split(",")) if len(line) > 3 else frozenset()
+            frame = InputFrame((float(line[1]), float(line[2])), keys)
+            for _ in range(int(line[0])):
+                yield frame
+
+
+def run_simulation(level: str, inputs: Iterable[InputFrame], seed: int = 0, delta_time: float = 1/60) -> SimulationResult:
+    random.seed(seed)
+    SOUNDS.enabled = False
+    view = GameView(headless=True)
+    view.setup(level)
+    frames = 0
+    start = time.perf_counter()
+    for frame in inputs:
+        if view.level is None:
+            break
+        view.mouse_pos = frame.mouse
+        view.keys_pressed = set(frame.keys)
+        view.on_update(delta_time)
+        frames += 1
+    seconds = time.perf_counter() - start
+    view.restore_positions()
+    return SimulationResult(view.level, frames, seconds, tuple(view.player.position), view.race_log)
+
+
+def verify_replay(data: bytes) -> VerifyResult:
+    # plays a recorded race back from the level start, as fast as it goes, the same time has to come out
+    header, inputs = read_replay(data)
+    SOUNDS.enabled = False
+    view = GameView(headless=True)
+    view.camera_position = header.camera
+    view.setup(header.level)
+    view.start_playback(header, inputs)
+    start = time.perf_counter()
+    for _ in range(header.end_tick):
+        view.on_update(view.tick) # exactly one tick per call
+        if view.level != header.level:
+            break
+    seconds = time.perf_counter() - start
+    times = [race_time for level, race_id, race_time in view.race_log if (level, race_id) == (header.level, header.race_id)]
+    replayed = times[-1] if times else None
+    return VerifyResult(replayed == header.race_time, header.build_hash == BUILD_HASH, header.race_time, replayed,
+                        header.end_tick, header.tick_rate, seconds)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="run a level without a window, as fast as possible")
+    parser.add_argument("level", nargs="?")
+    parser.add_argument("script", nargs="?", help="input script, holds the mouse up and to the right if left out")
+    parser.add_argument("--frames", type=int, default=6000, help="stop after this many frames")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verify", metavar="REPLAY", help="play back a saved .replay and check its time instead")
+    parser.add_argument("--check-platforms", action="store_true",
+                        help="check that sleeping platforms wake up where they would have been, on the level or every level")
+    args = parser.parse_args()
+
+    if args.check_platforms:
+        results = [check_platform_sleep(level, sleep) for level in ([args.level] if args.level else ("tutorial", "race", "tower"))
+                   for sleep in ((100, 2500), (1, 2999), (500, 501), (37, 1713))]
+        for result in results:
+            print(result.report())
+        raise SystemExit(0 if all(result.ok for result in results) else 1)
+
+    if args.verify:
+        with open(args.verify, "rb") as file:
+            print(verify_replay(file.read()).report())
+        raise SystemExit
+    if args.level is None:
+        parser.error("a level is needed unless --verify is used")
+
+    inputs = load_script(args.script) if args.script else iter(lambda: InputFrame((700, 500)), None)
+    inputs = (frame for frame, _ in zip(inputs, range(args.frames)))
+    result = run_simulation(args.level, inputs, args.seed)
+    print(result.report())
@@ -0,0 +1,62 @@
+import os
+import arcade
+from pyglet import media
+from typing import Dict, List
+from settings import SETTINGS
+
+
+SOUNDS_DIR = "assets/sounds"
+DEFAULT_VOICES = 4
+MAX_VOICES = { # how many copies of a sound can play at once, the oldest one gets cut off after that
+    "timer_bleep": 2,
+    "jump": 3,
+    "race_start": 1,
+    "teleporter": 2,
+}
+
+
+class SoundBank:
+    def __init__(self, directory: str = SOUNDS_DIR, max_voices: Dict[str, int] = MAX_VOICES) -> None:
+        self.directory = directory
+        self.max_voices = max_voices
+        self.sounds: Dict[str, arcade.Sound] = {}
+        self.voices: Dict[str, List[media.AudioPlayer]] = {}
+        self.enabled = True
+
+    def load(self) -> None:
+        for file in sorted(os.listdir(self.directory)):
+            name, ext = os.path.splitext(file)
+            if ext.lower() == ".wav" and name not in self.sounds:
+                self.load_sound(name)
+
+    def load_sound(self, name: str) -> arcade.Sound:
+        # streaming=False decodes the whole file into a StaticSource once, every play after that shares it
+        sound = arcade.Sound(f"{self.directory}/{name}.wav", streaming=False)
+        self.sounds[name] = sound
+        self.voices[name] = []
+        return sound
+
+    def play(self, name: str, volume: float = 1.0) -> media.AudioPlayer | None:
+        if not self.enabled:
+            return None
+        sound = self.sounds.get(name)
+        if sound is None:
+            sound = self.load_sound(name)
+        voices = self.voices[name]
+        for player in voices[:]:
+            if not player.playing:
+                voices.remove(player)
+        if len(voices) >= self.max_voices.get(name, DEFAULT_VOICES):
+            sound.stop(voices.pop(0)) # voice stealing
+        player = sound.play(volume=volume * SETTINGS.get("volume", 100) / 100)
+        voices.append(player)
+        return player
+
+    def stop_all(self) -> None:
+        for name, voices in self.voices.items():
+            for player in voices:
+                self.sounds[name].stop(player)
+            voices.clear()
+
+
+SOUNDS = SoundBank()
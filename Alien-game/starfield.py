@@ -0,0 +1,28 @@
+from arcade.experimental import Shadertoy
+from typing import Tuple
+
+from assets import ASSETS
+from render_scale import ScaledShadertoy
+
+
+class Starfield(ScaledShadertoy):
+    # the old stars shader in two halves: the noise only depends on the pixel, so it's baked into a texture
+    # whenever the resolution changes and every frame just looks it up and flickers it
+    def __init__(self, size: Tuple[int, int]) -> None:
+        super().__init__(size, ASSETS.get("starfield_shader"))
+        self.bake_shader = Shadertoy(size, ASSETS.get("starfield_bake_shader"))
+        self.baked = None
+
+    def render_shadertoy(self, time: float, size: Tuple[int, int]) -> None:
+        if self.baked is None or self.baked.size != size:
+            self.bake(size)
+        self.shadertoy.channel_0 = self.baked.color_attachments[0]
+        self.shadertoy.render(time=time, size=size)
+
+    def bake(self, size: Tuple[int, int]) -> None:
+        # half floats, brightness goes past 1 before the flicker scales it back down
+        texture = self.ctx.texture(size, components=4, dtype="f2",
+                                   filter=(self.ctx.NEAREST, self.ctx.NEAREST))
+        self.baked = self.ctx.framebuffer(color_attachments=[texture])
+        with self.baked.activate(), self.ctx.enabled_only(): # no blending, alpha holds noise too
+            self.bake_shader.render(size=size)
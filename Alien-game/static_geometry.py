@@ -0,0 +1,17 @@
+import pymunk
+from typing import List, Sequence, Tuple
+
+Rect = Tuple[float, float, float, float] # left, bottom, right, top
+
+
+def add_static_rects(space: pymunk.Space, rects: Sequence[Rect], friction: float, collision_type: int) -> List[pymunk.Poly]:
+    shapes = []
+    for left, bottom, right, top in rects:
+        shape = pymunk.Poly(space.static_body, [(left, bottom), (left, top), (right, top), (right, bottom)])
+        shape.friction = friction
+        shape.collision_type = collision_type
+        shapes.append(shape)
+    space.add(*shapes)
+    # static shapes live in their own tree that only needs rebuilding when they change, so do it once here
+    space.reindex_static()
+    return shapes
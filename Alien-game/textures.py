@@ -0,0 +1,49 @@
+import arcade
+from typing import Dict, Tuple
+
+
+class TextureRegistry:
+    def __init__(self) -> None:
+        self.sheets: Dict[str, arcade.SpriteSheet] = {}
+        self.textures: Dict[Tuple[str, Tuple[float, float, float, float] | None], arcade.Texture] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get_sheet(self, path: str) -> arcade.SpriteSheet:
+        sheet = self.sheets.get(path)
+        if sheet is None:
+            sheet = arcade.load_spritesheet(path)
+            self.sheets[path] = sheet
+        return sheet
+
+    def get_texture(self, path: str, rect: arcade.types.Rect) -> arcade.Texture:
+        key = (path, (rect.left, rect.bottom, rect.width, rect.height))
+        texture = self.textures.get(key)
+        if texture is not None:
+            self.hits += 1
+            return texture
+        self.misses += 1
+        texture = self.get_sheet(path).get_texture(rect, y_up=True)
+        self.textures[key] = texture
+        return texture
+
+    def load_texture(self, path: str) -> arcade.Texture: # whole file, same cache
+        key = (path, None)
+        texture = self.textures.get(key)
+        if texture is not None:
+            self.hits += 1
+            return texture
+        self.misses += 1
+        texture = arcade.load_texture(path)
+        self.textures[key] = texture
+        return texture
+
+    def stats(self) -> Dict[str, int]:
+        return {"sheets": len(self.sheets), "textures": len(self.textures),
+                "hits": self.hits, "misses": self.misses}
+
+    def report(self) -> str:
+        return "textures: {textures} sheets: {sheets} hits: {hits} misses: {misses}".format(**self.stats())
+
+
+TEXTURES = TextureRegistry()
@@ -0,0 +1,50 @@
+import math
+import arcade
+from typing import Dict, Iterable, List, Tuple
+
+
+class ChunkedLayer:
+    # tiles that never move, split into square chunks with a sprite list each. a sprite goes into the chunk
+    # its center is in, only the chunks that reach into the view get drawn
+    def __init__(self, chunk_size: float) -> None:
+        self.chunk_size = chunk_size
+        self.chunks: Dict[Tuple[int, int], arcade.SpriteList] = {}
+        self.reach = 0.0 # how far the biggest sprite sticks out of its chunk
+        self.drawn = 0
+        self.drawn_sprites = 0
+        self.sprite_count = 0
+
+    def chunk(self, x: float, y: float) -> Tuple[int, int]:
+        return (math.floor(x / self.chunk_size), math.floor(y / self.chunk_size))
+
+    def extend(self, sprites: Iterable[arcade.Sprite]) -> None:
+        # layers keep their order inside a chunk, so extend them in the order they should be drawn
+        grouped: Dict[Tuple[int, int], List[arcade.Sprite]] = {}
+        for sprite in sprites:
+            key = self.chunk(*sprite.position)
+            group = grouped.get(key)
+            if group is None:
+                group = grouped[key] = []
+            group.append(sprite)
+            self.reach = max(self.reach, sprite.width / 2, sprite.height / 2)
+        for key, group in grouped.items():
+            chunk = self.chunks.get(key)
+            if chunk is None:
+                chunk = self.chunks[key] = arcade.SpriteList()
+            chunk.extend(group)
+            self.sprite_count += len(group)
+
+    def draw(self, position: Tuple[float, float], size: Tuple[float, float], margin: float) -> None:
+        # position is the center of the view, like the camera's
+        reach = margin + self.reach
+        left, bottom = self.chunk(position[0] - size[0] / 2 - reach, position[1] - size[1] / 2 - reach)
+        right, top = self.chunk(position[0] + size[0] / 2 + reach, position[1] + size[1] / 2 + reach)
+        self.drawn = 0
+        self.drawn_sprites = 0
+        for cy in range(bottom, top + 1):
+            for cx in range(left, right + 1):
+                chunk = self.chunks.get((cx, cy))
+                if chunk is not None:
+                    chunk.draw()
+                    self.drawn += 1
+                    self.drawn_sprites += len(chunk)
@@ -0,0 +1,59 @@
+import arcade
+import pymunk
+from typing import Dict, Iterable, List, Tuple
+
+
+class TriggerVolumes:
+    # sensor shapes for everything the player can walk into, pymunk tells us when that happens
+    # so nothing has to be checked every frame
+    def __init__(self, physics_engine: arcade.PymunkPhysicsEngine, player_type: str = "player") -> None:
+        self.physics_engine = physics_engine
+        self.space = physics_engine.space
+        self.player_type = player_type
+        self.sprites: Dict[pymunk.Shape, arcade.Sprite] = {}
+        self.touching: Dict[str, List[arcade.Sprite]] = {}
+        self.entered: List[Tuple[str, arcade.Sprite]] = []
+
+    def collision_type(self, name: str) -> int:
+        if name not in self.physics_engine.collision_types:
+            self.physics_engine.collision_types.append(name)
+        return self.physics_engine.collision_types.index(name)
+
+    def add(self, kind: str, sprites: Iterable[arcade.Sprite]) -> None:
+        collision_type = self.collision_type(kind)
+        self.touching.setdefault(kind, [])
+        shapes = []
+        for sprite in sprites:
+            shape = pymunk.Poly(self.space.static_body, sprite.hit_box.get_adjusted_points())
+            shape.sensor = True
+            shape.collision_type = collision_type
+            self.sprites[shape] = sprite
+            shapes.append(shape)
+        if shapes:
+            self.space.add(*shapes)
+            self.space.reindex_static()
+        self.space.on_collision(self.collision_type(self.player_type), collision_type,
+                                begin=self.begin, separate=self.separate, data=kind)
+
+    def sprite_for(self, arbiter: pymunk.Arbiter) -> arcade.Sprite | None:
+        for shape in arbiter.shapes:
+            sprite = self.sprites.get(shape)
+            if sprite is not None:
+                return sprite
+        return None
+
+    # these run in the middle of space.step, so only take notes here and let the view act on them afterwards
+    def begin(self, arbiter: pymunk.Arbiter, space: pymunk.Space, kind: str) -> None:
+        sprite = self.sprite_for(arbiter)
+        if sprite is not None:
+            self.touching[kind].append(sprite)
+            self.entered.append((kind, sprite))
+
+    def separate(self, arbiter: pymunk.Arbiter, space: pymunk.Space, kind: str) -> None:
+        sprite = self.sprite_for(arbiter)
+        if sprite in self.touching[kind]:
+            self.touching[kind].remove(sprite)
+
+    def pop_entered(self) -> List[Tuple[str, arcade.Sprite]]:
+        entered, self.entered = self.entered, []
+        return entered
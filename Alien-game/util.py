@@ -1,26 +1,33 @@
-from typing import Dict, Any
+import time
+from typing import Dict, Any, List, NamedTuple, Tuple
+from settings import SETTINGS
 
 
-def save_settings(volume: int = None, fullscreen: bool = None) -> None:
-    settings = read_settings()
-    if volume is not None:
-        settings["volume"] = volume
-    if fullscreen is not None:
-        settings["fullscreen"] = int(fullscreen)
-    with open("assets/settings.txt", "w") as file:
-        lines = [f"{i};{int(settings[i])}\n" for i in settings.keys()]
-        file.writelines(lines)
+def save_settings(volume: int = None, fullscreen: bool = None, render_scale: int = None,
+                  auto_render_scale: bool = None) -> None:
+    SETTINGS.update(volume=volume, fullscreen=fullscreen, render_scale=render_scale, auto_render_scale=auto_render_scale)
 
 def read_settings() -> Dict[str, Any]:
-    res = {}
-    try:
-        with open("assets/settings.txt", "r") as file:
-            lines = [i.rstrip("\n").split(";") for i in file.readlines()]
-            for line in lines:
-                if line[0] == "volume":
-                    res["volume"] = int(line[1])
-                elif line[0] == "fullscreen":
-                    res["fullscreen"] = bool(int(line[1]))
-    except FileNotFoundError:
-        pass
-    return res
\ No newline at end of file
+    return SETTINGS.as_dict()
+
+
+class StartupTimer:
+    def __init__(self, start: float | None = None) -> None:
+        self.start = time.perf_counter() if start is None else start
+        self.marks: List[Tuple[str, float]] = []
+
+    def mark(self, name: str) -> None:
+        self.marks.append((name, time.perf_counter()))
+
+    def report(self) -> str:
+        lines = []
+        last = self.start
+        for name, stamp in self.marks:
+            lines.append(f"{name}: {(stamp - self.start) * 1000:.1f} ms (+{(stamp - last) * 1000:.1f} ms)")
+            last = stamp
+        return "\n".join(lines)
+
+
+class HeadlessWindow(NamedTuple): # stands in for arcade.Window when a view runs without one
+    width: int
+    height: int